@@ -0,0 +1,440 @@
+# Copyright 2024 H. Turgut Uyar <uyar@tekir.org>
+#
+# This file is part of CinemagoerNG.
+#
+# CinemagoerNG is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# CinemagoerNG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CinemagoerNG.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import copy
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field, fields, is_dataclass
+from pathlib import Path
+from typing import Any, Hashable, Optional
+
+import httpx
+
+from . import model, piculet
+
+
+@dataclass
+class CachedDocument:
+    body: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    scraped: dict[tuple[str, str], piculet.MapNode] = field(
+        default_factory=dict
+    )
+
+    def validators(self) -> dict[str, str]:
+        """Get the headers for a conditional request."""
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class DocumentCache:
+    """In-memory cache of fetched documents and their validators.
+
+    Documents are revalidated with the server on every fetch. When the
+    server answers "304 Not Modified", the stored document is reused
+    and so is the data scraped from it.
+
+    Counters:
+
+    - ``misses``: responses whose body was downloaded
+    - ``revalidated``: conditional requests sent to the server
+    - ``hits``: conditional requests answered with "304 Not Modified"
+    - ``parses_saved``: scrapes skipped because of reused documents
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.parses_saved = 0
+        self._entries: OrderedDict[str, CachedDocument] = OrderedDict()
+        self._by_body: dict[int, CachedDocument] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "parses_saved": self.parses_saved,
+        }
+
+    def lookup(self, url: str) -> Optional[CachedDocument]:
+        """Get the stored document for a URL, if any."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                self.revalidated += 1
+            return entry
+
+    def update(
+        self,
+        url: str,
+        response: httpx.Response,
+        entry: Optional[CachedDocument] = None,
+    ) -> Optional[bytes]:
+        """Update the cache from a response.
+
+        Returns the stored body if the response confirms
+        that the document hasn't been modified.
+        """
+        if (entry is not None) and (
+            response.status_code == httpx.codes.NOT_MODIFIED
+        ):
+            with self._lock:
+                self.hits += 1
+            return entry.body
+
+        with self._lock:
+            self.misses += 1
+        if not response.is_success:
+            return None
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if (etag is None) and (last_modified is None):
+            return None
+        new_entry = CachedDocument(
+            body=response.content, etag=etag, last_modified=last_modified
+        )
+        with self._lock:
+            self._discard(url)
+            self._entries[url] = new_entry
+            self._by_body[id(new_entry.body)] = new_entry
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+        return None
+
+    def _discard(self, url: str) -> None:
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            del self._by_body[id(entry.body)]
+
+    def scrape(
+        self,
+        document: bytes,
+        spec: piculet.Spec,
+        scraper: Callable[[bytes, piculet.Spec], piculet.MapNode],
+    ) -> piculet.MapNode:
+        """Scrape a document, reusing earlier results for stored bodies."""
+        with self._lock:
+            entry = self._by_body.get(id(document))
+        if (entry is None) or (entry.body is not document):
+            return scraper(document, spec)
+
+        key = (spec.url, spec.version)
+        data = entry.scraped.get(key)
+        if data is None:
+            data = scraper(document, spec)
+            entry.scraped[key] = data
+        else:
+            with self._lock:
+                self.parses_saved += 1
+        if len(data) == 0:
+            return data
+        # callers may take ownership of parts of the data
+        return copy.deepcopy(data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_body.clear()
+
+
+_HOUR = 3600.0
+_DAY = 24 * _HOUR
+
+DEFAULT_TTLS: dict[str, Optional[float]] = {
+    "search": _HOUR,
+    "main": _DAY,
+    "reference": _DAY,
+    "episodes": _DAY,
+    "episodes_with_pagination": _DAY,
+    "taglines": 7 * _DAY,
+    "parental_guide": 7 * _DAY,
+    "akas": 30 * _DAY,
+}
+
+
+class DiskCache:
+    """Size-bounded on-disk cache of fetched documents.
+
+    Every document is stored compressed in a file of its own. Files are
+    written atomically, so a cache directory can be shared by multiple
+    processes. How long a document stays fresh depends on the page it
+    belongs to; a TTL of ``None`` means the document never expires.
+    The TTLs in ``ttls`` override those in :data:`DEFAULT_TTLS` for
+    the pages they list.
+    When the total size exceeds ``max_bytes``, the least recently used
+    documents are removed.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        *,
+        max_bytes: int = 256 * 1024 * 1024,
+        default_ttl: Optional[float] = _DAY,
+        ttls: Optional[Mapping[str, Optional[float]]] = None,
+        compresslevel: int = 6,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = DEFAULT_TTLS | dict(ttls or {})
+        self.compresslevel = compresslevel
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _path(self, url: str) -> Path:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.gz"
+
+    def _ttl(self, page: Optional[str]) -> Optional[float]:
+        if page is None:
+            return self.default_ttl
+        return self.ttls.get(page, self.default_ttl)
+
+    def get(self, url: str, page: Optional[str] = None) -> Optional[bytes]:
+        """Get a fresh document from the cache, if there is one."""
+        path = self._path(url)
+        try:
+            content = gzip.decompress(path.read_bytes())
+        except (FileNotFoundError, EOFError, gzip.BadGzipFile):
+            return self._miss()
+        header, _, body = content.partition(b"\n")
+        meta = json.loads(header)
+        if meta["url"] != url:
+            return self._miss()
+        ttl = self._ttl(page)
+        if (ttl is not None) and (time.time() - meta["stored"] > ttl):
+            return self._miss()
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return body
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, url: str, body: bytes, page: Optional[str] = None) -> None:
+        """Store a document in the cache."""
+        path = self._path(url)
+        path.parent.mkdir(exist_ok=True)
+        header = json.dumps({"url": url, "stored": time.time()})
+        content = gzip.compress(
+            header.encode("utf-8") + b"\n" + body,
+            compresslevel=self.compresslevel,
+        )
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(content)
+            over_limit = (self._size is None) or (
+                self._size > self.max_bytes
+            )
+        if over_limit:
+            self._evict()
+
+    async def get_async(
+        self, url: str, page: Optional[str] = None
+    ) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get, url, page)
+
+    async def set_async(
+        self, url: str, body: bytes, page: Optional[str] = None
+    ) -> None:
+        await asyncio.to_thread(self.set, url, body, page)
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.directory.glob("*/*.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self) -> None:
+        """Remove least recently used documents until under the limit."""
+        entries = self._entries()
+        size = sum(e[1] for e in entries)
+        if size > self.max_bytes:
+            # leave some room so that eviction doesn't run on every write
+            target = self.max_bytes * 0.9
+            for _, entry_size, path in sorted(entries):
+                if size <= target:
+                    break
+                path.unlink(missing_ok=True)
+                size -= entry_size
+                with self._lock:
+                    self.evictions += 1
+        with self._lock:
+            self._size = size
+
+    def clear(self) -> None:
+        for _, _, path in self._entries():
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._size = 0
+
+
+def _sizeof(obj: Any) -> int:
+    """Estimate the memory used by an object and everything it contains."""
+    size = 0
+    seen: set[int] = set()
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+        elif is_dataclass(item):
+            stack.extend(getattr(item, f.name) for f in fields(item))
+    return size
+
+
+@dataclass
+class _CachedTitle:
+    title: model.Title
+    size: int
+    expires: float
+
+
+class TitleCache:
+    """Bounded in-memory cache of parsed titles.
+
+    Titles are kept until their TTL passes. When there are more than
+    ``maxsize`` titles, or their estimated total size exceeds
+    ``max_bytes``, the least recently used ones are dropped. Titles are
+    copied on the way in and on the way out, so callers can modify
+    the titles they get without affecting the cache.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        *,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 60.0,
+    ) -> None:
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries: OrderedDict[Hashable, _CachedTitle] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "titles": len(self._entries),
+            "bytes": self.size,
+        }
+
+    def get(self, key: Hashable) -> Optional[model.Title]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None) and (entry.expires < time.monotonic()):
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(entry.title)
+
+    def set(self, key: Hashable, title: model.Title) -> None:
+        title = copy.deepcopy(title)
+        entry = _CachedTitle(
+            title=title,
+            size=_sizeof(title),
+            expires=time.monotonic() + self.ttl,
+        )
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = entry
+            self.size += entry.size
+            while (len(self._entries) > self.maxsize) or (
+                self.size > self.max_bytes
+            ):
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
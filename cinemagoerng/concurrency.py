@@ -0,0 +1,336 @@
+# Copyright 2024 H. Turgut Uyar <uyar@tekir.org>
+#
+# This file is part of CinemagoerNG.
+#
+# CinemagoerNG is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# CinemagoerNG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CinemagoerNG.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import statistics
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable, Mapping
+from concurrent.futures import Future
+from typing import Any, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single call.
+
+    While a call for a key is in progress, later calls for the same key
+    wait for it to finish and get its result, or its exception.
+    The number of calls that were saved this way is counted in
+    :attr:`saved`.
+
+    If a ``copy`` function is given, the callers that joined a call get
+    copies of the result, so that they don't see each other's changes.
+    The caller that made the call gets the result itself, and nothing
+    is copied when nobody joined.
+    """
+
+    def __init__(self, copy: Optional[Callable[[Any], Any]] = None) -> None:
+        self.copy = copy
+        self.saved = 0
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+        self._tasks: dict[tuple[Any, Hashable], asyncio.Task] = {}
+        self._waiters: dict[Hashable, int] = {}
+
+    def _share(self, result: T) -> T:
+        return result if self.copy is None else self.copy(result)
+
+    def _join(self, key: Hashable) -> None:
+        self.saved += 1
+        self._waiters[key] += 1
+
+    def _finish(self, calls: dict, key: Hashable) -> int:
+        with self._lock:
+            del calls[key]
+            return self._waiters.pop(key)
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> tuple[T, bool]:
+        """Call a function unless a call with the same key is in progress.
+
+        Returns the result and whether it was produced by another call.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            joined = future is not None
+            if joined:
+                self._join(key)
+            else:
+                future = Future()
+                self._calls[key] = future
+                self._waiters[key] = 0
+        if joined:
+            return self._share(future.result()), True
+
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(self._calls, key)
+            future.set_exception(e)
+            raise
+        # waiters copy from a copy of their own, the caller may change
+        # the result as soon as it's returned
+        waiters = self._finish(self._calls, key)
+        future.set_result(self._share(result) if waiters > 0 else result)
+        return result, False
+
+    async def do_async(
+        self, key: Hashable, func: Callable[[], Awaitable[T]]
+    ) -> tuple[T, bool]:
+        """Await a coroutine unless one with the same key is in progress.
+
+        The coroutine runs in a task of its own, so cancelling one of
+        the waiting callers doesn't affect the others. Returns the result
+        and whether it was produced for another call.
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            joined = task is not None
+            if joined:
+                self._join(task_key)
+            else:
+                task = loop.create_task(self._run(task_key, func))
+                self._tasks[task_key] = task
+                self._waiters[task_key] = 0
+                task.add_done_callback(_retrieve_exception)
+        result, shared = await asyncio.shield(task)  # type: ignore
+        if joined:
+            return self._share(shared), True
+        return result, False
+
+    async def _run(
+        self, key: tuple[Any, Hashable], func: Callable[[], Awaitable[T]]
+    ) -> tuple[T, Optional[T]]:
+        try:
+            result = await func()
+        except BaseException:
+            self._finish(self._tasks, key)
+            raise
+        waiters = self._finish(self._tasks, key)
+        return result, (self._share(result) if waiters > 0 else None)
+
+
+def _retrieve_exception(task: Future) -> None:
+    if not task.cancelled():
+        # mark as retrieved, in case all callers were cancelled
+        task.exception()
+
+
+class TokenBucket:
+    """Token bucket that refills at a steady rate up to a burst size."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        if burst < 1:
+            raise ValueError("Burst size must be at least 1.")
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token and get how long to wait before using it.
+
+        Tokens can be taken ahead of time, in which case the bucket
+        goes into debt and later callers wait in turn.
+        """
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    """Client-side rate limiter with a token bucket for each host.
+
+    Every host gets ``rate`` requests per second, with bursts of up
+    to ``burst`` requests; ``hosts`` can override these for individual
+    hosts. A limiter can be shared between threads, event loops and
+    HTTP clients.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        *,
+        hosts: Optional[Mapping[str, tuple[float, int]]] = None,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.hosts = dict(hosts) if hosts is not None else {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, host: str) -> float:
+        """Take a token for a host and get how long to wait."""
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, burst = self.hosts.get(host, (self.rate, self.burst))
+                bucket = TokenBucket(rate, burst)
+                self._buckets[host] = bucket
+            return bucket.reserve()
+
+    def acquire(self, host: str) -> None:
+        """Block until a request to a host is allowed."""
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, host: str) -> None:
+        """Wait until a request to a host is allowed."""
+        delay = self.reserve(host)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_OVERLOADED = frozenset({429, 503})
+
+
+class AdaptiveLimiter:
+    """Concurrency limit for async requests, adjusted by feedback (AIMD).
+
+    Every successful response raises the limit a little, adding one slot
+    per round of requests. When the server responds with "429 Too Many
+    Requests" or "503 Service Unavailable", when a request fails, or when
+    the 95th percentile latency of the last ``window`` responses rises
+    above ``tolerance`` times the best seen so far, the limit is cut by
+    the ``backoff`` factor. The limit stays between ``min_limit`` and
+    ``max_limit``; the current value can be read from :attr:`limit`.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        *,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        window: int = 20,
+        tolerance: float = 1.5,
+        backoff: float = 0.5,
+    ) -> None:
+        if not (1 <= min_limit <= initial <= max_limit):
+            raise ValueError("Limits must satisfy 1 <= min <= initial <= max.")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.decreases = 0
+        self._limit = float(initial)
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._baseline: Optional[float] = None
+        self._last_latency = 0.0
+        self._last_decrease = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "decreases": self.decreases,
+            "baseline_p95": self._baseline,
+        }
+
+    async def acquire(self) -> None:
+        """Wait for a free slot."""
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self) -> None:
+        """Give back a slot."""
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = self.limit - self.in_flight
+        while (free > 0) and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.release()
+
+    def record(
+        self, latency: float, status_code: Optional[int] = None
+    ) -> None:
+        """Adjust the limit using the outcome of a request.
+
+        A missing status code means the request failed without a response.
+        """
+        self._last_latency = latency
+        if (status_code is None) or (status_code in _OVERLOADED):
+            self._decrease()
+            return
+
+        self._latencies.append(latency)
+        if len(self._latencies) == self._latencies.maxlen:
+            p95 = statistics.quantiles(self._latencies, n=20)[-1]
+            if (self._baseline is None) or (p95 < self._baseline):
+                self._baseline = p95
+            elif p95 > self._baseline * self.tolerance:
+                # let the baseline follow lasting changes, slowly
+                self._baseline = 0.9 * self._baseline + 0.1 * p95
+                self._latencies.clear()
+                self._decrease()
+                return
+
+        self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+        self._wake()
+
+    def _decrease(self) -> None:
+        # one decrease for a burst of failures from the same round trip,
+        # using the latest latency as the round trip until there's a baseline
+        now = time.monotonic()
+        round_trip = self._baseline
+        if round_trip is None:
+            round_trip = self._last_latency
+        if now - self._last_decrease < round_trip:
+            return
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.backoff)
+        self.decreases += 1
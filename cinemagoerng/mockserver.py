@@ -0,0 +1,287 @@
+# Copyright 2024 H. Turgut Uyar <uyar@tekir.org>
+#
+# This file is part of CinemagoerNG.
+#
+# CinemagoerNG is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# CinemagoerNG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CinemagoerNG.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Stand-in for the IMDb servers, for testing without the network.
+
+Pages are served from a fixture directory laid out as follows::
+
+    title/<imdb_id>/main.html            /title/<imdb_id>/
+    title/<imdb_id>/<page>.html          /title/<imdb_id>/<page>/
+    title/<imdb_id>/episodes-<n>.html    /title/<imdb_id>/episodes/?season=<n>
+    search/title.html                    /search/title/
+    graphql/<operation>.json             /?operationName=<operation>
+    graphql/<operation>/<imdb_id>.json   same, for the title in "const"
+
+GraphQL fixtures hold all the results in one response. The server serves
+them in pages, as requested by the "first" and "after" variables, using
+offsets as cursors. A ``<imdb_id>-season<n>.json`` fixture is used for
+episode queries filtered to season *n*.
+"""
+
+import json
+import random
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+
+
+# Where the paginated results are in the responses of GraphQL operations.
+CONNECTIONS: dict[str, tuple[str, ...]] = {
+    "AdvancedTitleSearch": ("data", "advancedTitleSearch"),
+    "TitleAkasPaginated": ("data", "title", "akas"),
+    "TitleEpisodesSubPagePagination": (
+        "data",
+        "title",
+        "episodes",
+        "episodes",
+    ),
+}
+
+
+def paginate(response: dict, path: tuple[str, ...], variables: dict) -> dict:
+    """Cut a page of results out of a full GraphQL response."""
+    connection = response
+    for key in path:
+        connection = connection.get(key) or {}
+    edges = connection.get("edges")
+    if edges is None:
+        return response
+
+    after = variables.get("after")
+    start = int(after) if str(after).isdigit() else 0
+    end = start + int(variables.get("first", 50))
+    connection["edges"] = edges[start:end]
+    connection["pageInfo"] = {
+        "hasNextPage": end < len(edges),
+        "endCursor": str(min(end, len(edges))),
+    }
+    connection.setdefault("total", len(edges))
+    return response
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def do_GET(self) -> None:
+        mock = self.server.mock
+        status, headers, body = mock.handle(self.path)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    mock: "MockIMDbServer"
+
+
+class MockIMDbServer:
+    """Local HTTP server that behaves like the IMDb web and GraphQL servers.
+
+    Every response is delayed by ``latency`` seconds, plus a random
+    amount of up to ``jitter`` seconds. A fraction of the requests,
+    given by ``error_rate``, gets "503 Service Unavailable", and another
+    fraction, given by ``throttle_rate``, gets "429 Too Many Requests"
+    with a ``Retry-After`` header. These can be changed while the server
+    is running. Counts of the requests and of the injected faults
+    are kept in :attr:`stats`.
+    """
+
+    def __init__(
+        self,
+        fixtures: Union[str, Path],
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 1,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.fixtures = Path(fixtures)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockIMDbServer":
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve in the current thread until interrupted."""
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        """Stop serving and release the port."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self) -> "MockIMDbServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _fault(self) -> Optional[tuple[int, dict[str, str], bytes]]:
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            draw = self._random.random()
+            if draw < self.error_rate:
+                self.stats["errors"] += 1
+                fault = 503
+            elif draw < self.error_rate + self.throttle_rate:
+                self.stats["throttled"] += 1
+                fault = 429
+            else:
+                fault = None
+        if delay > 0:
+            time.sleep(delay)
+        if fault == 503:
+            return 503, {}, b"Service Unavailable"
+        if fault == 429:
+            headers = {"Retry-After": str(self.retry_after)}
+            return 429, headers, b"Too Many Requests"
+        return None
+
+    def handle(self, target: str) -> tuple[int, dict[str, str], bytes]:
+        """Get the status, headers and body of the response to a request."""
+        fault = self._fault()
+        if fault is not None:
+            return fault
+
+        url = urlsplit(target)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if "operationName" in query:
+            return self._graphql(query)
+
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["search", "title"]:
+            return self._page(self.fixtures / "search" / "title.html")
+        if (len(parts) in (2, 3)) and (parts[0] == "title"):
+            page = parts[2] if len(parts) == 3 else "main"
+            title_dir = self.fixtures / "title" / parts[1]
+            season = query.get("season")
+            if (page == "episodes") and (season is not None):
+                season_page = title_dir / f"episodes-{season}.html"
+                if season_page.exists():
+                    return self._page(season_page)
+            return self._page(title_dir / f"{page}.html")
+        return 404, {}, b"Not Found"
+
+    def _page(self, path: Path) -> tuple[int, dict[str, str], bytes]:
+        if not path.is_file():
+            return 404, {}, b"Not Found"
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        return 200, headers, path.read_bytes()
+
+    def _graphql(
+        self, query: dict[str, str]
+    ) -> tuple[int, dict[str, str], bytes]:
+        operation = query["operationName"]
+        variables = json.loads(query.get("variables", "{}"))
+        imdb_id = variables.get("const")
+        candidates = []
+        if imdb_id is not None:
+            seasons = variables.get("filter", {}).get("includeSeasons", [])
+            if len(seasons) == 1:
+                name = f"{imdb_id}-season{seasons[0]}.json"
+                candidates.append(self.fixtures / "graphql" / operation / name)
+            candidates.append(
+                self.fixtures / "graphql" / operation / f"{imdb_id}.json"
+            )
+        candidates.append(self.fixtures / "graphql" / f"{operation}.json")
+
+        for path in candidates:
+            if path.is_file():
+                response = json.loads(path.read_bytes())
+                break
+        else:
+            return 404, {}, b"Not Found"
+
+        connection = CONNECTIONS.get(operation)
+        if connection is not None:
+            response = paginate(response, connection, variables)
+        headers = {"Content-Type": "application/json"}
+        return 200, headers, json.dumps(response).encode()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = ArgumentParser(description="Serve IMDb pages from fixtures.")
+    parser.add_argument("fixtures", help="fixture directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    server = MockIMDbServer(
+        args.fixtures,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+    )
+    print(f"Serving {args.fixtures} at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
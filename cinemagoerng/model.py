@@ -288,6 +288,7 @@ class _TVSeriesBase(_TimedTitle):
 class TVSeries(_TVSeriesBase):
     type_id: Literal["tvSeries"] = "tvSeries"
     season_count: int | None = None
+    seasons: list[int | str] = field(default_factory=list)
 
 
 @dataclass(kw_only=True)
@@ -16,12 +16,16 @@
 # along with CinemagoerNG.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import asyncio
 import json
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import (
+    AsyncIterator,
     Awaitable,
     Callable,
     Generic,
+    Iterator,
     List,
     Optional,
     TypeVar,
@@ -31,19 +35,32 @@ from urllib.parse import urlencode
 
 from typedload.exceptions import TypedloadValueError
 
-from . import model, piculet
+from . import model, piculet, registry
+from .cache import DocumentCache
 
 
 T = TypeVar("T")
 
-FetchFunction = Callable[..., Union[str, Awaitable[str]]]
+FetchFunction = Callable[..., Union[bytes, Awaitable[bytes]]]
+
+
+def _uses_next_data_only(spec: piculet.Spec) -> bool:
+    """Check whether a spec needs nothing but the Next.js data of a page."""
+    pre = [str(preprocess) for preprocess in spec.pre]
+    return (spec.doctype == "html") and (pre == ["parse_next_data"])
 
 
 class Operation(ABC, Generic[T]):
     """Base class for operations that can be performed sync or async."""
 
-    def __init__(self, fetch_func: FetchFunction):
+    def __init__(
+        self,
+        fetch_func: FetchFunction,
+        *,
+        document_cache: Optional[DocumentCache] = None,
+    ):
         self.fetch = fetch_func
+        self.document_cache = document_cache
 
     @abstractmethod
     def _process_data_sync(self, data: dict, **kwargs) -> T:
@@ -68,30 +85,57 @@ class Operation(ABC, Generic[T]):
             )
         return spec.url % url_params
 
-    def _scrape_document(self, document: str, spec: piculet.Spec) -> dict:
+    def _scrape_document(self, document: bytes, spec: piculet.Spec) -> dict:
         """Scrape document using the provided spec."""
+        if self.document_cache is not None:
+            return self.document_cache.scrape(document, spec, self._scrape)
+        return self._scrape(document, spec)
+
+    def _scrape(self, document: bytes, spec: piculet.Spec) -> dict:
+        if _uses_next_data_only(spec):
+            next_data = registry.find_next_data(document)
+            if next_data is not None:
+                # no need to parse the page
+                return piculet.scrape(
+                    next_data,
+                    doctype="json",
+                    rules=spec.rules,
+                    post=spec.post,
+                    json_decoder=spec.json_decoder,
+                    collector=spec.collector,
+                )
         return piculet.scrape(
             document,
             doctype=spec.doctype,
             rules=spec.rules,
             pre=spec.pre,
             post=spec.post,
+            json_decoder=spec.json_decoder,
+            collector=spec.collector,
         )
 
-    def execute(self, spec: piculet.Spec, **kwargs) -> T:
-        """Execute the operation synchronously."""
+    def _fetch_data(self, spec: piculet.Spec, **kwargs) -> dict:
+        """Fetch and scrape a document synchronously."""
+        url = self._get_url(spec, **kwargs)
+        next_data = _uses_next_data_only(spec)
+        document = self.fetch(url, next_data=next_data, **kwargs)
+        return self._scrape_document(document, spec)
 
+    async def _fetch_data_async(self, spec: piculet.Spec, **kwargs) -> dict:
+        """Fetch and scrape a document asynchronously."""
         url = self._get_url(spec, **kwargs)
-        document = self.fetch(url, **kwargs)
-        data = self._scrape_document(document, spec)
+        next_data = _uses_next_data_only(spec)
+        document = await self.fetch(url, next_data=next_data, **kwargs)
+        return self._scrape_document(document, spec)
+
+    def execute(self, spec: piculet.Spec, **kwargs) -> T:
+        """Execute the operation synchronously."""
+        data = self._fetch_data(spec, **kwargs)
         return self._process_data_sync(data, spec=spec, **kwargs)
 
     async def execute_async(self, spec: piculet.Spec, **kwargs) -> T:
         """Execute the operation asynchronously."""
-
-        url = self._get_url(spec, **kwargs)
-        document = await self.fetch(url, **kwargs)
-        data = self._scrape_document(document, spec)
+        data = await self._fetch_data_async(spec, **kwargs)
         return await self._process_data_async(data, spec=spec, **kwargs)
 
 
@@ -112,22 +156,44 @@ class GetTitle(Operation[Optional[model.Title]]):
 
 
 class UpdateTitle(Operation[None]):
-    """Operation for updating a title with additional information."""
+    """Operation for updating a title with additional information.
+
+    Paginated results are fetched one page at a time, in a loop,
+    stopping after ``max_pages`` pages or ``max_items`` episodes or AKAs,
+    if given.
+    """
 
     def __init__(
-        self, fetch_func: FetchFunction, title: model.Title, keys: List[str]
+        self,
+        fetch_func: FetchFunction,
+        title: model.Title,
+        keys: List[str],
+        *,
+        max_pages: Optional[int] = None,
+        max_items: Optional[int] = None,
+        document_cache: Optional[DocumentCache] = None,
     ):
-        super().__init__(fetch_func)
+        super().__init__(fetch_func, document_cache=document_cache)
         self.title = title
         self.keys = keys
+        self.max_pages = max_pages
+        self.max_items = max_items
+        self.pages = 0
+        self.items = 0
 
     def _update_fields(self, data: dict) -> None:
         """Update title fields from data."""
+        self.pages += 1
         for key in self.keys:
             value = data.get(key)
             if value is None:
                 continue
 
+            if key in ("episodes", "akas"):
+                if self.max_items is not None:
+                    value = value[: max(self.max_items - self.items, 0)]
+                self.items += len(value)
+
             if key == "episodes":
                 value = piculet.deserialize(value, list[model.TVEpisode])
                 self.title.add_episodes(value)
@@ -143,21 +209,42 @@ class UpdateTitle(Operation[None]):
             else:
                 setattr(self.title, key, value)
 
+    def _next_page_params(self, data: dict, **kwargs) -> Optional[dict]:
+        """Get the parameters for the next page, None if done."""
+        if not (kwargs.get("paginate_result") and data.get("has_next_page")):
+            return None
+        if (self.max_pages is not None) and (self.pages >= self.max_pages):
+            return None
+        if (self.max_items is not None) and (self.items >= self.max_items):
+            return None
+        return kwargs | {"after": f'"{data["end_cursor"]}"'}
+
     def _process_data_sync(self, data: dict, **kwargs) -> None:
-        """Process the data synchronously and handle pagination if needed."""
+        """Merge a page of data into the title."""
         self._update_fields(data)
 
-        if kwargs.get("paginate_result") and data.get("has_next_page", False):
-            kwargs["after"] = f'"{data["end_cursor"]}"'
-            self.execute(**kwargs)
-
     async def _process_data_async(self, data: dict, **kwargs) -> None:
-        """Process the data asynchronously and handle pagination if needed."""
-        self._update_fields(data)
-
-        if kwargs.get("paginate_result") and data.get("has_next_page", False):
-            kwargs["after"] = f'"{data["end_cursor"]}"'
-            await self.execute_async(**kwargs)
+        self._process_data_sync(data, **kwargs)
+
+    def execute(self, spec: piculet.Spec, **kwargs) -> None:
+        """Execute the operation synchronously, one page at a time."""
+        params: Optional[dict] = kwargs
+        while params is not None:
+            data = self._fetch_data(spec, **params)
+            self._process_data_sync(data, **params)
+            params = self._next_page_params(data, **params)
+            # drop the merged page before fetching the next one
+            del data
+
+    async def execute_async(self, spec: piculet.Spec, **kwargs) -> None:
+        """Execute the operation asynchronously, one page at a time."""
+        params: Optional[dict] = kwargs
+        while params is not None:
+            data = await self._fetch_data_async(spec, **params)
+            await self._process_data_async(data, **params)
+            params = self._next_page_params(data, **params)
+            # drop the merged page before fetching the next one
+            del data
 
 
 class SearchTitles(Operation[List[model.Title]]):
@@ -168,10 +255,14 @@ class SearchTitles(Operation[List[model.Title]]):
         fetch_func: FetchFunction,
         paginate: bool = False,
         target_count: Optional[int] = None,
+        *,
+        pipeline: bool = False,
+        document_cache: Optional[DocumentCache] = None,
     ):
-        super().__init__(fetch_func)
+        super().__init__(fetch_func, document_cache=document_cache)
         self.paginate = paginate
         self.target_count = target_count
+        self.pipeline = pipeline
 
     def _get_url(self, spec: piculet.Spec, **kwargs) -> str:
         """Generate URL from spec and parameters."""
@@ -234,100 +325,190 @@ class SearchTitles(Operation[List[model.Title]]):
         variables_json = json.dumps(graphql_variables, separators=(",", ":"))
         return variables_json, extensions_json
 
-    def _process_data_sync(self, data: dict, **kwargs) -> List[model.Title]:
-        """Process the data synchronously."""
-        titles = self._parse_results(data.get("results", []))
+    def _get_pagination_url(
+        self, spec: piculet.Spec, graphql_variables: dict
+    ) -> str:
+        variables_json, extensions_json = self._prepare_pagination_request(
+            graphql_variables
+        )
+        return spec.url % {
+            "variables": variables_json,
+            "extensions": extensions_json,
+        }
+
+    def _fetch_page(self, graphql_variables: dict, **kwargs) -> dict:
+        """Fetch and scrape a page of results."""
+        spec = kwargs["pagination_spec"]
+        document = self.fetch(
+            self._get_pagination_url(spec, graphql_variables),
+            httpx_kwargs=kwargs.get("httpx_kwargs"),
+            doc_type=spec.doctype,
+            variables=graphql_variables,
+            page=kwargs.get("page"),
+        )
+        return self._scrape_document(document, spec)  # type: ignore
+
+    async def _fetch_page_async(
+        self, graphql_variables: dict, **kwargs
+    ) -> dict:
+        """Fetch and scrape a page of results."""
+        spec = kwargs["pagination_spec"]
+        document = await self.fetch(
+            self._get_pagination_url(spec, graphql_variables),
+            httpx_kwargs=kwargs.get("httpx_kwargs"),
+            doc_type=spec.doctype,
+            variables=graphql_variables,
+            page=kwargs.get("page"),
+        )  # type: ignore
+        return self._scrape_document(document, spec)
+
+    def _has_next_page(self, data: dict, spec: Optional[piculet.Spec]) -> bool:
+        """Check whether results continue after the first page."""
+        return (
+            self.paginate
+            and (spec is not None)
+            and (len(data.get("results", [])) < data.get("total_results", 0))
+        )
 
-        if not self.paginate:
-            return titles
+    def _should_prefetch(self, has_next_page: bool, expected: int) -> bool:
+        return (
+            self.pipeline
+            and has_next_page
+            and (self.target_count is None or expected < self.target_count)
+        )
 
-        has_next_page = len(data.get("results", [])) < data.get(
-            "total_results", 0
+    def _reached_target(self, count: int) -> bool:
+        return (self.target_count is not None) and (
+            count >= self.target_count
         )
-        if not has_next_page:
-            return titles
 
-        # Continue with pagination using GraphQL
-        spec = kwargs.get("pagination_spec")
-        if not spec:
-            return titles
+    def _iter_pages(
+        self, data: dict, **kwargs
+    ) -> Iterator[List[model.Title]]:
+        """Parse results page by page, fetching further pages if needed.
 
-        graphql_variables = self._prepare_graphql_variables(data, **kwargs)
-        while has_next_page and (
-            self.target_count is None or len(titles) < self.target_count
-        ):
-            variables_json, extensions_json = self._prepare_pagination_request(
-                graphql_variables
+        In pipelined mode, the next page is fetched in a background
+        thread while the current one is being parsed and consumed.
+        """
+        spec = kwargs.get("pagination_spec")
+        results = data.get("results", [])
+        has_next_page = self._has_next_page(data, spec)
+        if has_next_page:
+            graphql_variables = self._prepare_graphql_variables(
+                data, **kwargs
             )
 
-            url = spec.url % {
-                "variables": variables_json,
-                "extensions": extensions_json,
-            }
-
-            document = self.fetch(
-                url,
-                httpx_kwargs=kwargs.get("httpx_kwargs"),
-                doc_type=spec.doctype,
-                variables=graphql_variables,
-            )  # type: ignore
-            page_data = self._scrape_document(document, spec)
+        count = 0
+        executor = ThreadPoolExecutor(max_workers=1) if self.pipeline else None
+        pending: Optional[Future] = None
+        try:
+            while True:
+                if self._should_prefetch(has_next_page, count + len(results)):
+                    pending = executor.submit(  # type: ignore
+                        self._fetch_page, graphql_variables.copy(), **kwargs
+                    )
+
+                titles = self._parse_results(results)
+                count += len(titles)
+                yield titles
+
+                if (not has_next_page) or self._reached_target(count):
+                    break
+                if pending is not None:
+                    page_data = pending.result()
+                    pending = None
+                else:
+                    page_data = self._fetch_page(
+                        graphql_variables.copy(), **kwargs
+                    )
+                results = page_data.get("results", [])
+                has_next_page = page_data.get("has_next_page", False)
+                if has_next_page:
+                    graphql_variables["after"] = page_data.get("end_cursor")
+        finally:
+            if pending is not None:
+                pending.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    async def _iter_pages_async(
+        self, data: dict, **kwargs
+    ) -> AsyncIterator[List[model.Title]]:
+        """Parse results page by page, fetching further pages if needed.
 
-            new_titles = self._parse_results(page_data.get("results", []))
-            titles.extend(new_titles)
+        In pipelined mode, the request for the next page is sent before
+        the current one is parsed and consumed.
+        """
+        spec = kwargs.get("pagination_spec")
+        results = data.get("results", [])
+        has_next_page = self._has_next_page(data, spec)
+        if has_next_page:
+            graphql_variables = self._prepare_graphql_variables(
+                data, **kwargs
+            )
 
-            has_next_page = page_data.get("has_next_page", False)
-            if has_next_page:
-                graphql_variables["after"] = page_data.get("end_cursor")
+        count = 0
+        pending: Optional[asyncio.Task] = None
+        try:
+            while True:
+                if self._should_prefetch(has_next_page, count + len(results)):
+                    pending = asyncio.create_task(
+                        self._fetch_page_async(
+                            graphql_variables.copy(), **kwargs
+                        )
+                    )
+                    await asyncio.sleep(0)  # let the request go out
+
+                titles = self._parse_results(results)
+                count += len(titles)
+                yield titles
+
+                if (not has_next_page) or self._reached_target(count):
+                    break
+                if pending is not None:
+                    page_data = await pending
+                    pending = None
+                else:
+                    page_data = await self._fetch_page_async(
+                        graphql_variables.copy(), **kwargs
+                    )
+                results = page_data.get("results", [])
+                has_next_page = page_data.get("has_next_page", False)
+                if has_next_page:
+                    graphql_variables["after"] = page_data.get("end_cursor")
+        finally:
+            if pending is not None:
+                pending.cancel()
 
+    def _process_data_sync(self, data: dict, **kwargs) -> List[model.Title]:
+        """Process the data synchronously."""
+        titles = []
+        for page_titles in self._iter_pages(data, **kwargs):
+            titles.extend(page_titles)
         return titles
 
     async def _process_data_async(
         self, data: dict, **kwargs
     ) -> List[model.Title]:
         """Process the data asynchronously."""
-        titles = self._parse_results(data.get("results", []))
-
-        if not self.paginate:
-            return titles
-
-        has_next_page = len(data.get("results", [])) < data.get(
-            "total_results", 0
-        )
-        if not has_next_page:
-            return titles
-
-        # Continue with pagination using GraphQL
-        spec = kwargs.get("pagination_spec")
-        if not spec:
-            return titles
+        titles = []
+        async for page_titles in self._iter_pages_async(data, **kwargs):
+            titles.extend(page_titles)
+        return titles
 
-        graphql_variables = self._prepare_graphql_variables(data, **kwargs)
-        while has_next_page and (
-            self.target_count is None or len(titles) < self.target_count
+    def iter_execute(
+        self, spec: piculet.Spec, **kwargs
+    ) -> Iterator[List[model.Title]]:
+        """Execute the search synchronously, yielding titles page by page."""
+        data = self._fetch_data(spec, **kwargs)
+        yield from self._iter_pages(data, spec=spec, **kwargs)
+
+    async def iter_execute_async(
+        self, spec: piculet.Spec, **kwargs
+    ) -> AsyncIterator[List[model.Title]]:
+        """Execute the search asynchronously, yielding titles page by page."""
+        data = await self._fetch_data_async(spec, **kwargs)
+        async for page_titles in self._iter_pages_async(
+            data, spec=spec, **kwargs
         ):
-            variables_json, extensions_json = self._prepare_pagination_request(
-                graphql_variables
-            )
-
-            url = spec.url % {
-                "variables": variables_json,
-                "extensions": extensions_json,
-            }
-
-            document = await self.fetch(
-                url,
-                httpx_kwargs=kwargs.get("httpx_kwargs"),
-                doc_type=spec.doctype,
-                variables=graphql_variables,
-            )  # type: ignore
-            page_data = self._scrape_document(document, spec)
-
-            new_titles = self._parse_results(page_data.get("results", []))
-            titles.extend(new_titles)
-
-            has_next_page = page_data.get("has_next_page", False)
-            if has_next_page:
-                graphql_variables["after"] = page_data.get("end_cursor")
-
-        return titles
+            yield page_titles
@@ -14,10 +14,13 @@
 # along with Piculet.  If not, see <http://www.gnu.org/licenses/>.
 
 import json
+import linecache
+import threading
+from collections import Counter
 from collections.abc import Callable
 from dataclasses import dataclass, field
 from decimal import Decimal
-from functools import partial
+from functools import cached_property, partial
 from types import MappingProxyType
 from typing import (
     Any,
@@ -31,9 +34,11 @@ from typing import (
 
 import typedload
 from jmespath import compile as compile_jmespath
+from jmespath.parser import ParsedResult
 from lxml.etree import XPath as compile_xpath
 from lxml.etree import _Element as TreeNode
 from lxml.etree import fromstring as parse_xml
+from lxml.html import HTMLParser
 from lxml.html import fromstring as parse_html
 
 
@@ -84,13 +89,88 @@ def make_dict(item: DictItem, /) -> dict[str, Any]:
     return {item["key"]: value}
 
 
+JSONDecoder: TypeAlias = Callable[[str | bytes], Any]
+
+
+def _with_fallback(
+    loads: JSONDecoder, errors: tuple[type[Exception], ...]
+) -> JSONDecoder:
+    # documents that the fast decoder rejects, like the ones with NaN
+    # or with integers that don't fit in 64 bits, go to the stdlib decoder
+    def decode(document: str | bytes) -> Any:
+        try:
+            return loads(document)
+        except errors:
+            return json.loads(document)
+
+    return decode
+
+
+json_decoders: dict[str, JSONDecoder] = {"json": json.loads}
+
+try:
+    import orjson
+except ImportError:
+    pass
+else:
+    json_decoders["orjson"] = _with_fallback(
+        orjson.loads, (orjson.JSONDecodeError,)
+    )
+
+try:
+    import msgspec
+except ImportError:
+    pass
+else:
+    json_decoders["msgspec"] = _with_fallback(
+        msgspec.json.decode, (msgspec.DecodeError,)
+    )
+
+_JSON_DECODER_NAMES = ("orjson", "msgspec", "json")
+
+_json_decoder: JSONDecoder = json.loads
+
+
+def get_json_decoder(name: str | None = None) -> JSONDecoder:
+    """Get a JSON decoder by name.
+
+    If the name is not given, the decoder selected with
+    :func:`set_json_decoder` is returned. If the library for the named
+    decoder is not installed, the stdlib decoder is used instead.
+    """
+    if name is None:
+        return _json_decoder
+    if name not in _JSON_DECODER_NAMES:
+        raise ValueError(f"Unknown JSON decoder: {name}")
+    return json_decoders.get(name, json.loads)
+
+
+def set_json_decoder(name: str | None = None) -> None:
+    """Select the JSON decoder to use by default.
+
+    Without a name, the fastest decoder available is selected.
+    """
+    global _json_decoder
+    if name is None:
+        name = next(n for n in _JSON_DECODER_NAMES if n in json_decoders)
+    _json_decoder = get_json_decoder(name)
+
+
+set_json_decoder()
+
+
+def load_json(document: str | bytes) -> Any:
+    """Decode a JSON document using the default decoder."""
+    return _json_decoder(document)
+
+
 Transformer: TypeAlias = Callable[[Any], Any]
 
 
 transformers: dict[str, Transformer] = {
     "decimal": lambda x: Decimal(str(x)),
     "int": int,
-    "json": json.loads,
+    "json": load_json,
     "lower": str.lower,
     "make_dict": make_dict,
     "str": str,
@@ -122,10 +202,120 @@ class TreePath:
         return self._compiled(root)  # type: ignore
 
 
+def _lookup(value: Any, names: tuple[str, ...]) -> Any:
+    # same as evaluating the JMESPath expression "name1.name2..."
+    for name in names:
+        try:
+            value = value.get(name)
+        except AttributeError:
+            return None
+    return value
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _field_getter(names: tuple[str, ...]) -> Callable[[Any], Any]:
+    if len(names) == 1:
+        name = names[0]
+
+        def get(value: Any) -> Any:
+            try:
+                return value.get(name)
+            except AttributeError:
+                return None
+
+        return get
+    return partial(_lookup, names=names)
+
+
+def _projector(
+    left: Callable[[Any], Any], right: Callable[[Any], Any]
+) -> Callable[[Any], Any]:
+    if right is _identity:
+
+        def project_all(value: Any) -> Any:
+            base = left(value)
+            if not isinstance(base, list):
+                return None
+            return [item for item in base if item is not None]
+
+        return project_all
+
+    def project(value: Any) -> Any:
+        base = left(value)
+        if not isinstance(base, list):
+            return None
+        collected = []
+        for item in base:
+            current = right(item)
+            if current is not None:
+                collected.append(current)
+        return collected
+
+    return project
+
+
+def _compile_simple(node: dict[str, Any]) -> Callable[[Any], Any] | None:
+    """Compile a simple JMESPath expression into direct lookups.
+
+    Simple expressions consist of field lookups, like ``a.b.c``,
+    and list projections, like ``a[*].b``. Other expressions
+    are not compiled, and ``None`` is returned for them.
+    """
+    match node["type"]:
+        case "field":
+            return _field_getter((node["value"],))
+        case "current" | "identity":
+            return _identity
+        case "projection":
+            left = _compile_simple(node["children"][0])
+            right = _compile_simple(node["children"][1])
+            if (left is None) or (right is None):
+                return None
+            return _projector(left, right)
+        case "subexpression":
+            steps: list[Callable[[Any], Any]] = []
+            names: list[str] = []
+            for child in node["children"]:
+                if child["type"] == "field":
+                    names.append(child["value"])
+                    continue
+                if len(names) > 0:
+                    steps.append(_field_getter(tuple(names)))
+                    names = []
+                step = _compile_simple(child)
+                if step is None:
+                    return None
+                steps.append(step)
+            if len(names) > 0:
+                steps.append(_field_getter(tuple(names)))
+            if len(steps) == 1:
+                return steps[0]
+
+            def chain(value: Any) -> Any:
+                for step in steps:
+                    value = step(value)
+                return value
+
+            return chain
+    return None
+
+
+def _compile_parsed(path: str, parsed: dict[str, Any]) -> Callable:
+    compiled = _compile_simple(parsed)
+    if compiled is not None:
+        return compiled
+    return ParsedResult(path, parsed).search
+
+
 class MapPath:
     def __init__(self, path: str) -> None:
         self.path: str = path
-        self._compiled = compile_jmespath(path).search
+        expression = compile_jmespath(path)
+        self._parsed: dict[str, Any] = expression.parsed
+        self._compiled = _compile_parsed(path, expression.parsed)
 
     def __str__(self) -> str:
         return self.path
@@ -138,6 +328,86 @@ class MapPath:
         return selected if selected is not None else []  # type: ignore
 
 
+# JMESPath nodes that evaluate their first child on their input,
+# and the rest of their children on the result of the first child
+_LEFT_FIRST = frozenset(
+    {
+        "subexpression",
+        "projection",
+        "index_expression",
+        "filter_projection",
+        "flatten",
+        "value_projection",
+        "pipe",
+    }
+)
+
+_CURRENT = {"type": "current", "children": []}
+
+
+def _leading_fields(node: dict[str, Any]) -> tuple[str, ...]:
+    """Get the field lookups that a JMESPath expression starts with."""
+    match node["type"]:
+        case "field":
+            return (node["value"],)
+        case "subexpression":
+            names: list[str] = []
+            for child in node["children"]:
+                if child["type"] != "field":
+                    return (*names, *_leading_fields(child))
+                names.append(child["value"])
+            return tuple(names)
+        case type_ if type_ in _LEFT_FIRST:
+            return _leading_fields(node["children"][0])
+    return ()
+
+
+def _strip_fields(node: dict[str, Any], n: int) -> dict[str, Any]:
+    """Remove the first ``n`` leading field lookups of an expression.
+
+    Applying the result to the node reached by these lookups gives
+    the same value as applying the original expression to the root.
+    """
+    if n == 0:
+        return node
+    match node["type"]:
+        case "field":
+            return _CURRENT
+        case "subexpression":
+            children = node["children"]
+            while (n > 0) and (children[0]["type"] == "field"):
+                children = children[1:]
+                n -= 1
+            if n > 0:
+                children = [_strip_fields(children[0], n), *children[1:]]
+            if len(children) == 0:
+                return _CURRENT
+            if len(children) == 1:
+                return children[0]
+            return node | {"children": children}
+    first, *others = node["children"]
+    return node | {"children": [_strip_fields(first, n), *others]}
+
+
+def _shared_prefixes(
+    chains: list[tuple[str, ...]],
+) -> list[tuple[str, ...]]:
+    """Find the field lookups worth doing once for a group of paths.
+
+    A prefix is chosen if at least two paths start with it and they
+    don't all continue with the same field. Shorter prefixes come first.
+    """
+    counts = Counter(c[:i] for c in chains for i in range(1, len(c) + 1))
+    widest: dict[tuple[str, ...], int] = {}
+    for prefix, count in counts.items():
+        parent = prefix[:-1]
+        widest[parent] = max(widest.get(parent, 0), count)
+    return sorted(
+        (p for p, n in counts.items() if (n >= 2) and (widest.get(p, 0) < n)),
+        key=len,
+    )
+
+
 @dataclass(kw_only=True)
 class Extractor:
     transforms: list[Transform] = field(default_factory=list)
@@ -251,6 +521,200 @@ def collect(
     return data if len(data) > 0 else _EMPTY
 
 
+Collector: TypeAlias = Callable[[TreeNode | MapNode], MapNode]
+
+
+class _RuleCompiler:
+    """Generator for the source code of a collector function.
+
+    The generated code does what :func:`collect` does for the same rules,
+    with the loops over the rules and the transforms unrolled, and with
+    the paths and transforms bound to names in the module namespace.
+    """
+
+    def __init__(self) -> None:
+        self.namespace: dict[str, Any] = {"_EMPTY": _EMPTY, "_lookup": _lookup}
+        self.functions: list[list[str]] = []
+        self._names: dict[int, str] = {}
+        self._factored: dict[int, tuple[str, str]] = {}
+
+    def ref(self, obj: Any, prefix: str) -> str:
+        name = self._names.get(id(obj))
+        if name is None:
+            name = f"_{prefix}{len(self._names)}"
+            self._names[id(obj)] = name
+            self.namespace[name] = obj
+        return name
+
+    def transformed(self, expr: str, transforms: list[Transform]) -> str:
+        for transform in transforms:
+            expr = f"{self.ref(transform.apply, 't')}({expr})"
+        return expr
+
+    def call(self, path: TreePath | MapPath, node: str) -> str:
+        factored = self._factored.get(id(path))
+        if (factored is not None) and (node == "root"):
+            prefix, residual = factored
+            return f"{residual}({prefix})"
+        return f"{self.ref(path._compiled, 'p')}({node})"
+
+    def select(self, path: TreePath | MapPath, node: str) -> str:
+        if isinstance(path, TreePath):
+            return self.call(path, node)
+        return f"(s if (s := {self.call(path, node)}) is not None else [])"
+
+    def prefixes(self, rules: list[MapRule]) -> list[str]:
+        """Evaluate the shared prefixes of the paths applied to the root.
+
+        The paths that start with a prefix are changed to continue
+        from the node of the prefix.
+        """
+        paths: list[MapPath] = []
+        for rule in rules:
+            if rule.foreach is not None:
+                paths.append(rule.foreach)
+                continue
+            if isinstance(rule.key, MapPicker):
+                paths.append(rule.key.path)
+            if rule.extractor.foreach is not None:
+                paths.append(rule.extractor.foreach)
+            elif isinstance(rule.extractor, MapPicker):
+                paths.append(rule.extractor.path)
+        chains = [_leading_fields(path._parsed) for path in paths]
+        prefixes = _shared_prefixes(chains)
+
+        lines: list[str] = []
+        names: dict[tuple[str, ...], str] = {}
+        for prefix in prefixes:
+            parent = max(
+                (p for p in names if prefix[: len(p)] == p),
+                key=len,
+                default=(),
+            )
+            node = names.get(parent, "root")
+            names[prefix] = f"prefix{len(names)}"
+            rest = prefix[len(parent) :]
+            lines.append(f"{names[prefix]} = _lookup({node}, {rest!r})")
+
+        for path, chain in zip(paths, chains):
+            prefix = max(
+                (p for p in names if chain[: len(p)] == p), key=len, default=()
+            )
+            if len(prefix) > 0:
+                parsed = _strip_fields(path._parsed, len(prefix))
+                residual = _compile_parsed(path.path, parsed)
+                self._factored[id(path)] = (
+                    names[prefix],
+                    self.ref(residual, "r"),
+                )
+        return lines
+
+    def extract(
+        self, extractor: Extractor, node: str, target: str
+    ) -> list[str]:
+        match extractor:
+            case TreePicker():
+                compiled = self.ref(extractor.path._compiled, "p")
+                return [
+                    f"selected = {compiled}({node})",
+                    f"{target} = {extractor.sep!r}.join(selected)"
+                    " if len(selected) > 0 else None",
+                ]
+            case MapPicker():
+                return [f"{target} = {self.call(extractor.path, node)}"]
+            case TreeCollector() | MapCollector():
+                function = self.function(extractor.rules)
+                return [f"{target} = {function}({node})"]
+        raise TypeError(f"Unknown extractor: {type(extractor).__name__}")
+
+    def function(self, rules: list[TreeRule] | list[MapRule]) -> str:
+        index = len(self.functions)
+        name = f"_collect{index}"
+        lines = [f"def {name}(root):", "    data = {}"]
+        self.functions.append(lines)
+        if all(isinstance(rule, MapRule) for rule in rules):
+            lines.extend("    " + line for line in self.prefixes(rules))
+        for rule in rules:
+            lines.extend("    " + line for line in self.rule(rule))
+        lines.append("    return data if len(data) > 0 else _EMPTY")
+        return name
+
+    def rule(self, rule: TreeRule | MapRule) -> list[str]:
+        if isinstance(rule.key, str):
+            lines = [f"# {rule.key!r}"]
+        else:
+            lines = [f"# key from {str(rule.key.path)!r}"]
+        indent = ""
+        subroot = "root"
+        if rule.foreach is not None:
+            lines.append(
+                f"for subroot in {self.select(rule.foreach, 'root')}:"
+            )
+            indent = "    "
+            subroot = "subroot"
+
+        extractor = rule.extractor
+        found = "(raw is not _EMPTY) and (raw is not None)"
+        if extractor.foreach is None:
+            lines.extend(
+                indent + line
+                for line in self.extract(extractor, subroot, "raw")
+            )
+            lines.append(f"{indent}if {found}:")
+            value = self.transformed("raw", extractor.transforms)
+        else:
+            nodes = self.select(extractor.foreach, subroot)
+            lines.append(f"{indent}values = []")
+            lines.append(f"{indent}for node in {nodes}:")
+            lines.extend(
+                f"{indent}    {line}"
+                for line in self.extract(extractor, "node", "raw")
+            )
+            item = self.transformed("raw", extractor.transforms)
+            lines.append(f"{indent}    if {found}:")
+            lines.append(f"{indent}        values.append({item})")
+            lines.append(f"{indent}if len(values) > 0:")
+            value = "values"
+        indent += "    "
+        value = self.transformed(value, rule.transforms)
+        lines.append(f"{indent}value = {value}")
+
+        if isinstance(rule.key, str):
+            lines.append(f"{indent}data[{rule.key!r}] = value")
+        else:
+            lines.extend(
+                indent + line
+                for line in self.extract(rule.key, subroot, "key")
+            )
+            key = self.transformed("key", rule.key.transforms)
+            lines.append(f"{indent}data[{key}] = value")
+        return lines
+
+
+def compile_rules(
+    rules: list[TreeRule] | list[MapRule], *, name: str = "rules"
+) -> Collector:
+    """Compile rules into a function that works like :func:`collect`.
+
+    The source code of the generated function is kept in its
+    ``__source__`` attribute and shows up in tracebacks.
+    """
+    compiler = _RuleCompiler()
+    entry = compiler.function(rules)
+    source = "\n\n".join("\n".join(f) for f in compiler.functions) + "\n"
+    filename = f"<piculet {name}>"
+    exec(compile(source, filename, "exec"), compiler.namespace)
+    linecache.cache[filename] = (
+        len(source),
+        None,
+        source.splitlines(keepends=True),
+        filename,
+    )
+    collector = compiler.namespace[entry]
+    collector.__source__ = source
+    return collector
+
+
 DocType: TypeAlias = Literal["html", "xml", "json"]
 
 
@@ -264,6 +728,12 @@ class Spec:
     pre: list[Preprocess] = field(default_factory=list)
     post: list[Postprocess] = field(default_factory=list)
     rules: list[TreeRule] | list[MapRule]
+    json_decoder: str | None = None
+
+    @cached_property
+    def collector(self) -> Collector:
+        """Compiled version of the rules, generated on first use."""
+        return compile_rules(self.rules, name=f"{self.url} {self.version}")
 
 
 @dataclass(kw_only=True)
@@ -278,25 +748,45 @@ class MapSpec(Spec):
     rules: list[MapRule]
 
 
+_parsers = threading.local()
+
+
+def _utf8_html_parser() -> HTMLParser:
+    parser = getattr(_parsers, "html", None)
+    if parser is None:
+        parser = HTMLParser(encoding="utf-8")
+        _parsers.html = parser
+    return parser
+
+
 def scrape(
-    document: str,
+    document: str | bytes,
     *,
     doctype: DocType,
     rules: list[TreeRule] | list[MapRule],
     pre: list[Preprocess] | None = None,
     post: list[Postprocess] | None = None,
+    json_decoder: str | None = None,
+    collector: Collector | None = None,
 ) -> MapNode:
     match doctype:
         case "html":
-            root = parse_html(document)
+            if isinstance(document, bytes):
+                # HTML bytes would be taken as Latin-1 without a meta tag
+                root = parse_html(document, parser=_utf8_html_parser())
+            else:
+                root = parse_html(document)
         case "xml":
             root = parse_xml(document)
         case "json":
-            root = json.loads(document)
+            root = get_json_decoder(json_decoder)(document)
     if pre:
         for preprocess in pre:
             root = preprocess.apply(root)
-    data = collect(root, rules)
+    if collector is not None:
+        data = collector(root)
+    else:
+        data = collect(root, rules)
     if post:
         for postprocess in post:
             postprocess.apply(data)
@@ -0,0 +1,163 @@
+# Copyright 2024 H. Turgut Uyar <uyar@tekir.org>
+#
+# This file is part of CinemagoerNG.
+#
+# CinemagoerNG is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# CinemagoerNG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CinemagoerNG.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import statistics
+import threading
+import time
+from collections.abc import Iterable
+from typing import Any, Optional
+
+from .resilience import RETRY_STATUSES
+
+
+class _ProxyState:
+    def __init__(self) -> None:
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+
+class ProxyPool:
+    """Pool of egress proxies, picked by their recent performance.
+
+    For every request, two proxies are picked at random and the one with
+    the better score is used ("power of two choices"). The score grows
+    with the average latency of the proxy, the requests it has in flight,
+    and its error rate. Latencies and error rates are exponentially
+    weighted moving averages, with ``alpha`` as the weight of the latest
+    request. A request fails when it gets no response, or one of the
+    ``statuses``. After ``max_failures`` failures in a row, a proxy is
+    taken out of the pool for ``ejection_time`` seconds.
+    """
+
+    def __init__(
+        self,
+        proxies: Iterable[str],
+        *,
+        alpha: float = 0.3,
+        max_failures: int = 3,
+        ejection_time: float = 30.0,
+        statuses: frozenset[int] = RETRY_STATUSES,
+    ) -> None:
+        self._proxies = {proxy: _ProxyState() for proxy in proxies}
+        if not self._proxies:
+            raise ValueError("There must be at least one proxy.")
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.ejection_time = ejection_time
+        self.statuses = statuses
+        self._lock = threading.Lock()
+
+    @property
+    def proxies(self) -> list[str]:
+        return list(self._proxies)
+
+    @property
+    def stats(self) -> dict[str, dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                proxy: {
+                    "latency": state.latency,
+                    "error_rate": state.error_rate,
+                    "in_flight": state.in_flight,
+                    "requests": state.requests,
+                    "ejections": state.ejections,
+                    "ejected": state.ejected_until > now,
+                }
+                for proxy, state in self._proxies.items()
+            }
+
+    def _default_latency(self) -> float:
+        # proxies without a successful request yet are taken to be typical,
+        # so that their error rate still counts against them
+        latencies = [
+            state.latency
+            for state in self._proxies.values()
+            if state.latency is not None
+        ]
+        return statistics.median(latencies) if latencies else 1.0
+
+    def _score(self, state: _ProxyState, default_latency: float) -> float:
+        latency = (
+            state.latency if state.latency is not None else default_latency
+        )
+        return (
+            latency * (state.in_flight + 1) / max(1 - state.error_rate, 0.01)
+        )
+
+    def acquire(self) -> str:
+        """Pick a proxy for a request."""
+        now = time.monotonic()
+        with self._lock:
+            available = [
+                proxy
+                for proxy, state in self._proxies.items()
+                if state.ejected_until <= now
+            ]
+            if not available:
+                # all ejected: use the one that will be back the soonest
+                available = [
+                    min(
+                        self._proxies,
+                        key=lambda p: self._proxies[p].ejected_until,
+                    )
+                ]
+            candidates = random.sample(available, min(2, len(available)))
+            default_latency = self._default_latency()
+            proxy = min(
+                candidates,
+                key=lambda p: self._score(self._proxies[p], default_latency),
+            )
+            state = self._proxies[proxy]
+            state.in_flight += 1
+            state.requests += 1
+            return proxy
+
+    def release(self, proxy: str) -> None:
+        """Mark a request through a proxy as done."""
+        with self._lock:
+            self._proxies[proxy].in_flight -= 1
+
+    def record(
+        self, proxy: str, latency: float, status_code: Optional[int] = None
+    ) -> None:
+        """Record the outcome of a request through a proxy.
+
+        A missing status code means the request failed without a response.
+        """
+        failed = (status_code is None) or (status_code in self.statuses)
+        with self._lock:
+            state = self._proxies[proxy]
+            state.error_rate += self.alpha * (float(failed) - state.error_rate)
+            if failed:
+                state.failures += 1
+                if state.failures >= self.max_failures:
+                    state.failures = 0
+                    state.ejected_until = time.monotonic() + self.ejection_time
+                    state.ejections += 1
+                return
+            state.failures = 0
+            if state.latency is None:
+                state.latency = latency
+            else:
+                state.latency += self.alpha * (latency - state.latency)
@@ -27,13 +27,55 @@ from .piculet import (
     Transformer,
     TreeNode,
     TreePath,
+    load_json,
 )
 
 
+_NEXT_DATA_PATH = TreePath("//script[@id='__NEXT_DATA__']/text()")
+
+
 def parse_next_data(root: TreeNode) -> MapNode:
-    path = TreePath("//script[@id='__NEXT_DATA__']/text()")
-    next_data = path.apply(root)[0]
-    return json.loads(next_data)
+    next_data = _NEXT_DATA_PATH.apply(root)[0]
+    return load_json(next_data)
+
+
+def is_next_data_tag(document: bytes | bytearray, marker: int) -> bool:
+    """Check whether an occurrence of ``__NEXT_DATA__`` is a script id.
+
+    The marker must be the quoted value of the ``id`` attribute
+    in a ``<script`` start tag.
+    """
+    quote = document[marker - 1 : marker]
+    if (quote not in (b'"', b"'")) or (
+        document[marker + 13 : marker + 14] != quote
+    ):
+        return False
+    tag_start = document.rfind(b"<", 0, marker)
+    tag = document[tag_start:marker].lower()
+    if (tag_start < 0) or (not tag.startswith(b"<script")) or (b">" in tag):
+        return False
+    return tag.endswith(b"id=" + quote)
+
+
+def find_next_data(document: bytes) -> bytes | None:
+    """Find the contents of the ``__NEXT_DATA__`` script in a page.
+
+    The page is scanned without being parsed. If the markup doesn't look
+    as expected, for example if the id occurs more than once, the result
+    is ``None`` and the page should be parsed instead.
+    """
+    marker = document.find(b"__NEXT_DATA__")
+    if (marker < 0) or (document.find(b"__NEXT_DATA__", marker + 1) >= 0):
+        return None
+    if not is_next_data_tag(document, marker):
+        return None
+    start = document.find(b">", marker)
+    if start < 0:
+        return None
+    end = document.find(b"</script>", start)
+    if end < 0:
+        return None
+    return document[start + 1 : end]
 
 
 def remove_see_more(root: TreeNode) -> TreeNode:
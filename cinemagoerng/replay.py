@@ -0,0 +1,266 @@
+# Copyright 2024 H. Turgut Uyar <uyar@tekir.org>
+#
+# This file is part of CinemagoerNG.
+#
+# CinemagoerNG is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# CinemagoerNG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CinemagoerNG.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Optional, Union
+
+import httpx
+
+
+Latency = Union[float, Callable[[httpx.Request], float]]
+
+
+def request_key(request: httpx.Request) -> str:
+    """Get the key that identifies a request in an archive.
+
+    Query parameters are sorted, and the ones that hold JSON values,
+    like GraphQL variables, are normalized, so that the key doesn't
+    depend on the order in which they were built.
+    """
+    params = []
+    for name, value in sorted(request.url.params.multi_items()):
+        try:
+            value = json.dumps(
+                json.loads(value), sort_keys=True, separators=(",", ":")
+            )
+        except ValueError:
+            pass
+        params.append((name, value))
+    url = request.url.copy_with(query=None)
+    return (
+        f"{request.method} {url}?{json.dumps(params, separators=(',', ':'))}"
+    )
+
+
+class RecordedResponse:
+    """Response stored in an archive, with its body as sent on the wire."""
+
+    def __init__(
+        self,
+        status_code: int,
+        headers: list[tuple[str, str]],
+        body: bytes,
+        http_version: str = "HTTP/1.1",
+    ) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.http_version = http_version
+
+    def to_response(self) -> httpx.Response:
+        return httpx.Response(
+            self.status_code,
+            headers=self.headers,
+            content=self.body,
+            extensions={"http_version": self.http_version.encode("ascii")},
+        )
+
+
+def load_archive(path: Union[str, Path]) -> dict[str, RecordedResponse]:
+    """Load the responses in an archive, keyed by request."""
+    responses = {}
+    with gzip.open(path, "rb") as f:
+        while header := f.readline():
+            meta = json.loads(header)
+            body = f.read(meta["size"])
+            responses[meta["key"]] = RecordedResponse(
+                meta["status"],
+                [tuple(item) for item in meta["headers"]],  # type: ignore
+                body,
+                meta["http_version"],
+            )
+    return responses
+
+
+def save_archive(
+    path: Union[str, Path], responses: dict[str, RecordedResponse]
+) -> None:
+    """Save responses to an archive, replacing it atomically.
+
+    Every response is stored as a line of JSON metadata,
+    followed by the raw body, in a gzip compressed file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wb") as f:
+            for key, response in responses.items():
+                meta = {
+                    "key": key,
+                    "status": response.status_code,
+                    "headers": response.headers,
+                    "http_version": response.http_version,
+                    "size": len(response.body),
+                }
+                f.write(json.dumps(meta, separators=(",", ":")).encode())
+                f.write(b"\n")
+                f.write(response.body)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Transport that records the responses it gets into an archive.
+
+    Requests are sent through ``transport``, or through a default HTTP
+    transport if not given. The archive is written when the transport
+    is closed, or when :meth:`save` is called. The same transport can be
+    used for both sync and async clients.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        transport: Optional[
+            Union[httpx.BaseTransport, httpx.AsyncBaseTransport]
+        ] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.responses: dict[str, RecordedResponse] = {}
+        self._transport = transport
+        self._sync_transport: Optional[httpx.BaseTransport] = None
+        self._async_transport: Optional[httpx.AsyncBaseTransport] = None
+        self._lock = threading.Lock()
+
+    def _record(
+        self, request: httpx.Request, response: httpx.Response, body: bytes
+    ) -> httpx.Response:
+        recorded = RecordedResponse(
+            response.status_code,
+            response.headers.multi_items(),
+            body,
+            response.http_version,
+        )
+        with self._lock:
+            self.responses[request_key(request)] = recorded
+        return recorded.to_response()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self._transport
+        if transport is None:
+            if self._sync_transport is None:
+                self._sync_transport = httpx.HTTPTransport()
+            transport = self._sync_transport
+        response = transport.handle_request(request)  # type: ignore
+        # read the stream itself: the body should stay as it was sent,
+        # even if the transport has already read the response
+        try:
+            body = b"".join(response.stream)  # type: ignore
+        finally:
+            response.close()
+        return self._record(request, response, body)
+
+    async def handle_async_request(
+        self, request: httpx.Request
+    ) -> httpx.Response:
+        transport = self._transport
+        if transport is None:
+            if self._async_transport is None:
+                self._async_transport = httpx.AsyncHTTPTransport()
+            transport = self._async_transport
+        response = await transport.handle_async_request(  # type: ignore
+            request
+        )
+        try:
+            stream = response.stream
+            body = b"".join([chunk async for chunk in stream])  # type: ignore
+        finally:
+            await response.aclose()
+        return self._record(request, response, body)
+
+    def save(self) -> None:
+        """Write the recorded responses to the archive."""
+        with self._lock:
+            responses = dict(self.responses)
+        save_archive(self.path, responses)
+
+    def close(self) -> None:
+        self.save()
+        if self._sync_transport is not None:
+            self._sync_transport.close()
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.save)
+        if self._async_transport is not None:
+            await self._async_transport.aclose()
+
+
+class ReplayMissError(httpx.TransportError):
+    """Request that is not in the archive being replayed."""
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Transport that serves the responses recorded in an archive.
+
+    Every response is delayed by ``latency`` seconds, which can also be
+    a function of the request, to simulate a network. Requests that are
+    not in the archive raise :class:`ReplayMissError`. The same
+    transport can be used for both sync and async clients.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], *, latency: Latency = 0.0
+    ) -> None:
+        self.responses = load_archive(path)
+        self.latency = latency
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, request: httpx.Request) -> RecordedResponse:
+        recorded = self.responses.get(request_key(request))
+        with self._lock:
+            if recorded is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if recorded is None:
+            raise ReplayMissError(
+                f"No recorded response for {request.url}", request=request
+            )
+        return recorded
+
+    def _get_latency(self, request: httpx.Request) -> float:
+        latency = self.latency
+        return latency(request) if callable(latency) else latency
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        recorded = self._lookup(request)
+        delay = self._get_latency(request)
+        if delay > 0:
+            time.sleep(delay)
+        return recorded.to_response()
+
+    async def handle_async_request(
+        self, request: httpx.Request
+    ) -> httpx.Response:
+        recorded = self._lookup(request)
+        delay = self._get_latency(request)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return recorded.to_response()
@@ -0,0 +1,307 @@
+# Copyright 2024 H. Turgut Uyar <uyar@tekir.org>
+#
+# This file is part of CinemagoerNG.
+#
+# CinemagoerNG is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# CinemagoerNG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CinemagoerNG.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+import httpx
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Failures where the request can safely be sent again.
+RETRY_ERRORS = (
+    httpx.TimeoutException,
+    httpx.NetworkError,
+    httpx.RemoteProtocolError,
+)
+
+
+class RetryBudget:
+    """Limit on retries as a fraction of all requests.
+
+    Every request adds ``ratio`` tokens to the budget, up to
+    ``max_tokens``, and every retry takes one token. This keeps retries
+    from multiplying the load on a server that is already struggling.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        *,
+        initial: float = 10.0,
+        max_tokens: float = 100.0,
+    ) -> None:
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = initial
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    """Policy for retrying failed requests.
+
+    Requests that time out, lose their connection, or get one of the
+    ``statuses`` are tried again, up to ``max_attempts`` attempts in total.
+    The delay before attempt *n* + 1 is picked randomly between zero and
+    ``backoff * 2 ** (n - 1)`` seconds ("full jitter"), capped at
+    ``max_backoff``. A ``Retry-After`` header from the server takes
+    precedence, with the same cap. Retries are also limited by a
+    :class:`RetryBudget`, if one is given.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        *,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        statuses: frozenset[int] = RETRY_STATUSES,
+        budget: Optional[RetryBudget] = None,
+    ) -> None:
+        if max_attempts < 1:
+            raise ValueError("There must be at least one attempt.")
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.budget = budget
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Register a new request."""
+        if self.budget is not None:
+            self.budget.deposit()
+
+    def should_retry(
+        self,
+        attempt: int,
+        *,
+        response: Optional[httpx.Response] = None,
+        error: Optional[Exception] = None,
+    ) -> bool:
+        """Check whether a request should be tried again."""
+        if attempt >= self.max_attempts:
+            return False
+        if response is not None:
+            retryable = response.status_code in self.statuses
+        else:
+            retryable = isinstance(error, RETRY_ERRORS)
+        if not retryable:
+            return False
+        if (self.budget is not None) and (not self.budget.withdraw()):
+            return False
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def delay(
+        self, attempt: int, response: Optional[httpx.Response] = None
+    ) -> float:
+        """Get how long to wait before the next attempt."""
+        if response is not None:
+            retry_after = _parse_retry_after(
+                response.headers.get("Retry-After")
+            )
+            if retry_after is not None:
+                return min(self.max_backoff, retry_after)
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """Request refused because the circuit for its host is open."""
+
+    def __init__(self, host: str, retry_after: float) -> None:
+        super().__init__(
+            f"Circuit for {host} is open, retry in {retry_after:.1f}s"
+        )
+        self.host = host
+        self.retry_after = retry_after
+
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class _Circuit:
+    def __init__(self, window: int) -> None:
+        self.state = CLOSED
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.opened_at = 0.0
+        self.probes = 0
+        self.trips = 0
+        self.rejected = 0
+
+
+class CircuitBreaker:
+    """Circuit breaker that stops requests to failing hosts.
+
+    Every host has its own circuit. A circuit opens when at least
+    ``failure_rate`` of the last ``window`` requests to its host have
+    failed, counting only after ``min_requests`` requests. While open,
+    requests fail immediately with :class:`CircuitOpenError`. After
+    ``reset_timeout`` seconds the circuit becomes half-open and lets
+    ``half_open_requests`` probes through: a successful probe closes it,
+    a failed one opens it again.
+
+    Requests fail when they get no response, or one of the ``statuses``.
+    The state of the circuits can be monitored through :attr:`stats`.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        *,
+        window: int = 20,
+        min_requests: int = 10,
+        reset_timeout: float = 30.0,
+        half_open_requests: int = 1,
+        statuses: frozenset[int] = RETRY_STATUSES,
+    ) -> None:
+        if not (0 < failure_rate <= 1):
+            raise ValueError("Failure rate must be in (0, 1].")
+        if not (1 <= min_requests <= window):
+            raise ValueError("Minimum requests must be in [1, window].")
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_requests = min_requests
+        self.reset_timeout = reset_timeout
+        self.half_open_requests = half_open_requests
+        self.statuses = statuses
+        self._circuits: dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def _get_circuit(self, host: str) -> _Circuit:
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = _Circuit(self.window)
+            self._circuits[host] = circuit
+        return circuit
+
+    def state(self, host: str) -> str:
+        """Get the state of the circuit for a host."""
+        with self._lock:
+            circuit = self._circuits.get(host)
+            return circuit.state if circuit is not None else CLOSED
+
+    @property
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                host: {
+                    "state": circuit.state,
+                    "requests": len(circuit.outcomes),
+                    "failures": circuit.outcomes.count(False),
+                    "trips": circuit.trips,
+                    "rejected": circuit.rejected,
+                }
+                for host, circuit in self._circuits.items()
+            }
+
+    def before_request(self, host: str) -> None:
+        """Check whether a request to a host is allowed.
+
+        :raise CircuitOpenError: If the circuit for the host is open.
+        """
+        with self._lock:
+            circuit = self._get_circuit(host)
+            if circuit.state == OPEN:
+                waited = time.monotonic() - circuit.opened_at
+                if waited < self.reset_timeout:
+                    circuit.rejected += 1
+                    raise CircuitOpenError(host, self.reset_timeout - waited)
+                circuit.state = HALF_OPEN
+                circuit.probes = 0
+            if circuit.state == HALF_OPEN:
+                if circuit.probes >= self.half_open_requests:
+                    circuit.rejected += 1
+                    raise CircuitOpenError(host, 0.0)
+                circuit.probes += 1
+
+    def record(self, host: str, status_code: Optional[int] = None) -> None:
+        """Record the outcome of a request to a host.
+
+        A missing status code means the request failed without a response.
+        """
+        success = (status_code is not None) and (
+            status_code not in self.statuses
+        )
+        with self._lock:
+            circuit = self._get_circuit(host)
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(0, circuit.probes - 1)
+                if success:
+                    circuit.state = CLOSED
+                    circuit.outcomes.clear()
+                else:
+                    self._open(circuit)
+                return
+            circuit.outcomes.append(success)
+            if circuit.state == CLOSED and self._should_open(circuit):
+                self._open(circuit)
+
+    def cancel(self, host: str) -> None:
+        """Forget a request to a host that ended without an outcome."""
+        with self._lock:
+            circuit = self._get_circuit(host)
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(0, circuit.probes - 1)
+
+    def _should_open(self, circuit: _Circuit) -> bool:
+        requests = len(circuit.outcomes)
+        if requests < self.min_requests:
+            return False
+        failures = circuit.outcomes.count(False)
+        return failures >= self.failure_rate * requests
+
+    def _open(self, circuit: _Circuit) -> None:
+        circuit.state = OPEN
+        circuit.opened_at = time.monotonic()
+        circuit.outcomes.clear()
+        circuit.trips += 1
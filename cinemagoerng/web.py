@@ -15,28 +15,192 @@
 # You should have received a copy of the GNU General Public License
 # along with CinemagoerNG.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
+import copy
+import itertools
 import json
+import threading
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from http import HTTPStatus
 from pathlib import Path
-from typing import List, Literal, Optional, TypeAlias
+from typing import Any, List, Literal, Optional, TypeAlias
+from weakref import WeakKeyDictionary
 
 import httpx
 
 from . import model, piculet, registry
+from .cache import CachedDocument, DiskCache, DocumentCache, TitleCache
+from .concurrency import AdaptiveLimiter, RateLimiter, SingleFlight
 from .operations import GetTitle, SearchTitles, UpdateTitle
+from .proxies import ProxyPool
+from .resilience import RETRY_ERRORS, CircuitBreaker, RetryPolicy
 
 
 _USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:102.0) Firefox/102.0"
 
+_DEFAULT_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=30.0,
+)
+
+# These can be given per request, so they don't need a pool of their own.
+_REQUEST_PARAMS = frozenset({"timeout", "follow_redirects"})
+
+
+_NEXT_DATA = b"__NEXT_DATA__"
+_SCRIPT_END = b"</script>"
+
+# Headers that no longer apply to a body that was decoded and cut short.
+_BODY_HEADERS = frozenset({"content-encoding", "content-length"})
+
+
+class _NextDataScanner:
+    """Collect a page until the end of its ``__NEXT_DATA__`` script.
+
+    If the marker occurs anywhere other than the id of a script tag,
+    the markup is ambiguous and the whole page is collected.
+    """
+
+    def __init__(self) -> None:
+        self.body = bytearray()
+        self._start = -1
+        self._searched = 0
+        self._ambiguous = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """Add a chunk of the page, and check whether the script is done."""
+        self.body += chunk
+        if self._ambiguous:
+            return False
+        if self._start < 0:
+            marker = self.body.find(_NEXT_DATA, self._searched)
+            if marker < 0:
+                self._searched = max(0, len(self.body) - len(_NEXT_DATA) + 1)
+                return False
+            if len(self.body) <= marker + len(_NEXT_DATA):
+                # the closing quote is needed for checking the tag
+                self._searched = marker
+                return False
+            if not registry.is_next_data_tag(self.body, marker):
+                self._ambiguous = True
+                return False
+            self._start = marker
+            self._searched = marker + len(_NEXT_DATA)
+        end = self.body.find(_SCRIPT_END, self._searched)
+        if end < 0:
+            self._searched = max(
+                self._searched, len(self.body) - len(_SCRIPT_END) + 1
+            )
+            return False
+        del self.body[end + len(_SCRIPT_END) :]
+        return True
+
+    def make_response(self, response: httpx.Response) -> httpx.Response:
+        """Make a response with the collected part of the page."""
+        headers = [
+            (name, value)
+            for name, value in response.headers.multi_items()
+            if name.lower() not in _BODY_HEADERS
+        ]
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=bytes(self.body),
+            request=response.request,
+            extensions={"http_version": response.http_version.encode()},
+        )
+
 
 class HTTPClient:
-    def __init__(self):
+    """HTTP client that keeps connections alive between requests.
+
+    Sync and async requests use separate connection pools. A pool is created
+    on first use for each distinct set of client parameters, and is reused
+    until the client is closed. Async pools are bound to the event loop
+    they were created in.
+
+    With ``http2`` enabled, concurrent requests to the same host are
+    multiplexed over a single connection where the server supports it.
+    The protocol each response actually used is counted
+    in :attr:`http_versions`.
+
+    A ``document_cache`` makes requests conditional on the validators
+    of the stored documents, and reuses them if they haven't changed.
+    A ``disk_cache`` serves documents from disk while they are fresh,
+    without making any requests.
+
+    A ``rate_limiter`` spaces out the requests sent to each host.
+    A ``concurrency_limiter`` caps the number of async requests in flight,
+    adapting the cap to the latencies and statuses of the responses.
+
+    A ``retry_policy`` retries requests that fail for transient reasons.
+    Since every page is retried on its own, a failure in the middle of
+    a pagination resumes from the page that failed.
+
+    A ``circuit_breaker`` makes requests to a host that keeps failing
+    fail fast, instead of waiting for timeouts.
+
+    A ``proxy_pool`` spreads requests over several proxies, picking one
+    for every attempt by its recent latency and error rate. Every proxy
+    gets a connection pool of its own.
+
+    Pages requested with ``next_data``, where only the ``__NEXT_DATA__``
+    script is needed, are downloaded incrementally and only parsed up to
+    the end of the script, unless ``stream_next_data`` is disabled.
+    Over HTTP/2 the download stops there; over HTTP/1.1 the rest of the
+    page is still read, so that the connection can be reused.
+    """
+
+    def __init__(
+        self,
+        *,
+        limits: Optional[httpx.Limits] = None,
+        http2: bool = False,
+        document_cache: Optional[DocumentCache] = None,
+        disk_cache: Optional[DiskCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        concurrency_limiter: Optional[AdaptiveLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        proxy_pool: Optional[ProxyPool] = None,
+        stream_next_data: bool = True,
+        **client_params,
+    ):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                raise ImportError(
+                    "HTTP/2 support requires the 'http2' extra:"
+                    " pip install cinemagoerng[http2]"
+                ) from None
         self.headers = {"User-Agent": _USER_AGENT}
         self._default_client_params = {
             "timeout": 30.0,
             "follow_redirects": True,
+            "limits": limits if limits is not None else _DEFAULT_LIMITS,
+            "http2": http2,
         }
+        self._default_client_params.update(client_params)
+        self._lock = threading.Lock()
+        self.http_versions: Counter[str] = Counter()
+        self.document_cache = document_cache
+        self.disk_cache = disk_cache
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.proxy_pool = proxy_pool
+        self.stream_next_data = stream_next_data
+        self._clients: dict[str, httpx.Client] = {}
+        self._async_clients: WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]
+        ] = WeakKeyDictionary()
 
     def _get_headers(self, url: str) -> dict:
         headers = self.headers.copy()
@@ -52,27 +216,448 @@ class HTTPClient:
             params.update(httpx_kwargs)
         return params
 
+    def _split_params(self, params: dict) -> tuple[str, dict, dict]:
+        """Separate pool parameters from per-request parameters."""
+        pool_params = {
+            k: v for k, v in params.items() if k not in _REQUEST_PARAMS
+        }
+        request_params = {
+            k: v for k, v in params.items() if k in _REQUEST_PARAMS
+        }
+        key = repr(sorted(pool_params.items()))
+        return key, pool_params, request_params
+
+    def _get_client(self, key: str, pool_params: dict) -> httpx.Client:
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = httpx.Client(**pool_params)
+                    self._clients[key] = client
+        return client
+
+    def _get_async_client(
+        self, key: str, pool_params: dict
+    ) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # the pools of closed loops can't be used or closed anymore,
+            # and their connections keep the loops alive
+            for closed in [lp for lp in self._async_clients if lp.is_closed()]:
+                del self._async_clients[closed]
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = httpx.AsyncClient(**pool_params)
+                clients[key] = client
+        return client
+
+    def _prepare_request(
+        self, url: str
+    ) -> tuple[dict, Optional[CachedDocument]]:
+        headers = self._get_headers(url)
+        cached = None
+        if self.document_cache is not None:
+            cached = self.document_cache.lookup(url)
+            if cached is not None:
+                headers.update(cached.validators())
+        return headers, cached
+
+    def _handle_response(
+        self,
+        url: str,
+        response: httpx.Response,
+        cached: Optional[CachedDocument],
+    ) -> bytes:
+        with self._lock:
+            self.http_versions[response.http_version] += 1
+        if self.document_cache is not None:
+            body = self.document_cache.update(url, response, cached)
+            if body is not None:
+                return body
+        response.raise_for_status()
+        return response.content
+
+    async def _client_get_async(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: dict,
+        request_params: dict,
+        next_data: bool,
+    ) -> httpx.Response:
+        if not next_data:
+            return await client.get(url, headers=headers, **request_params)
+        async with client.stream(
+            "GET", url, headers=headers, **request_params
+        ) as response:
+            if not response.is_success:
+                await response.aread()
+                return response
+            scanner = _NextDataScanner()
+            chunks = response.aiter_bytes()
+            async for chunk in chunks:
+                if scanner.feed(chunk):
+                    break
+            if response.http_version != "HTTP/2":
+                # closing an HTTP/1.1 response early discards its connection
+                async for _ in chunks:
+                    pass
+        return scanner.make_response(response)
+
+    def _client_get(
+        self,
+        client: httpx.Client,
+        url: str,
+        headers: dict,
+        request_params: dict,
+        next_data: bool,
+    ) -> httpx.Response:
+        if not next_data:
+            return client.get(url, headers=headers, **request_params)
+        with client.stream(
+            "GET", url, headers=headers, **request_params
+        ) as response:
+            if not response.is_success:
+                response.read()
+                return response
+            scanner = _NextDataScanner()
+            chunks = response.iter_bytes()
+            for chunk in chunks:
+                if scanner.feed(chunk):
+                    break
+            if response.http_version != "HTTP/2":
+                # closing an HTTP/1.1 response early discards its connection
+                for _ in chunks:
+                    pass
+        return scanner.make_response(response)
+
+    async def _send_async(
+        self, url: str, headers: dict, params: dict, next_data: bool
+    ) -> httpx.Response:
+        policy = self.retry_policy
+        if policy is None:
+            return await self._send_once_async(url, headers, params, next_data)
+
+        policy.start()
+        attempt = 1
+        while True:
+            try:
+                response = await self._send_once_async(
+                    url, headers, params, next_data
+                )
+            except RETRY_ERRORS as e:
+                if not policy.should_retry(attempt, error=e):
+                    raise
+                delay = policy.delay(attempt)
+            else:
+                if not policy.should_retry(attempt, response=response):
+                    return response
+                delay = policy.delay(attempt, response)
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send_once_async(
+        self, url: str, headers: dict, params: dict, next_data: bool
+    ) -> httpx.Response:
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return await self._get_async(url, headers, params, next_data)
+
+        host = httpx.URL(url).host
+        breaker.before_request(host)
+        try:
+            response = await self._get_async(url, headers, params, next_data)
+        except httpx.TransportError:
+            breaker.record(host)
+            raise
+        except BaseException:
+            breaker.cancel(host)
+            raise
+        breaker.record(host, response.status_code)
+        return response
+
+    async def _get_async(
+        self, url: str, headers: dict, params: dict, next_data: bool
+    ) -> httpx.Response:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(httpx.URL(url).host)
+        limiter = self.concurrency_limiter
+        if limiter is None:
+            return await self._request_async(url, headers, params, next_data)
+
+        async with limiter:
+            start = time.monotonic()
+            try:
+                response = await self._request_async(
+                    url, headers, params, next_data
+                )
+            except httpx.TransportError:
+                limiter.record(time.monotonic() - start)
+                raise
+            limiter.record(time.monotonic() - start, response.status_code)
+            return response
+
+    async def _request_async(
+        self, url: str, headers: dict, params: dict, next_data: bool
+    ) -> httpx.Response:
+        pool = self.proxy_pool
+        if pool is None:
+            key, pool_params, request_params = self._split_params(params)
+            client = self._get_async_client(key, pool_params)
+            return await self._client_get_async(
+                client, url, headers, request_params, next_data
+            )
+
+        proxy = pool.acquire()
+        key, pool_params, request_params = self._split_params(
+            params | {"proxy": proxy}
+        )
+        client = self._get_async_client(key, pool_params)
+        start = time.monotonic()
+        try:
+            response = await self._client_get_async(
+                client, url, headers, request_params, next_data
+            )
+        except httpx.TransportError:
+            pool.record(proxy, time.monotonic() - start)
+            raise
+        finally:
+            pool.release(proxy)
+        pool.record(proxy, time.monotonic() - start, response.status_code)
+        return response
+
+    def _send(
+        self, url: str, headers: dict, params: dict, next_data: bool
+    ) -> httpx.Response:
+        policy = self.retry_policy
+        if policy is None:
+            return self._send_once(url, headers, params, next_data)
+
+        policy.start()
+        attempt = 1
+        while True:
+            try:
+                response = self._send_once(url, headers, params, next_data)
+            except RETRY_ERRORS as e:
+                if not policy.should_retry(attempt, error=e):
+                    raise
+                delay = policy.delay(attempt)
+            else:
+                if not policy.should_retry(attempt, response=response):
+                    return response
+                delay = policy.delay(attempt, response)
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _send_once(
+        self, url: str, headers: dict, params: dict, next_data: bool
+    ) -> httpx.Response:
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return self._get(url, headers, params, next_data)
+
+        host = httpx.URL(url).host
+        breaker.before_request(host)
+        try:
+            response = self._get(url, headers, params, next_data)
+        except httpx.TransportError:
+            breaker.record(host)
+            raise
+        except BaseException:
+            breaker.cancel(host)
+            raise
+        breaker.record(host, response.status_code)
+        return response
+
+    def _get(
+        self, url: str, headers: dict, params: dict, next_data: bool
+    ) -> httpx.Response:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(httpx.URL(url).host)
+        return self._request(url, headers, params, next_data)
+
+    def _request(
+        self, url: str, headers: dict, params: dict, next_data: bool
+    ) -> httpx.Response:
+        pool = self.proxy_pool
+        if pool is None:
+            key, pool_params, request_params = self._split_params(params)
+            client = self._get_client(key, pool_params)
+            return self._client_get(
+                client, url, headers, request_params, next_data
+            )
+
+        proxy = pool.acquire()
+        key, pool_params, request_params = self._split_params(
+            params | {"proxy": proxy}
+        )
+        client = self._get_client(key, pool_params)
+        start = time.monotonic()
+        try:
+            response = self._client_get(
+                client, url, headers, request_params, next_data
+            )
+        except httpx.TransportError:
+            pool.record(proxy, time.monotonic() - start)
+            raise
+        finally:
+            pool.release(proxy)
+        pool.record(proxy, time.monotonic() - start, response.status_code)
+        return response
+
     async def fetch_async(
-        self, url: str, httpx_kwargs: Optional[dict] = None, **kwargs
-    ) -> str:
-        client_params = self._merge_client_params(httpx_kwargs)
-        async with httpx.AsyncClient(**client_params) as client:
-            response = await client.get(url, headers=self._get_headers(url))
-            response.raise_for_status()
-            return response.text
+        self,
+        url: str,
+        httpx_kwargs: Optional[dict] = None,
+        *,
+        next_data: bool = False,
+        **kwargs,
+    ) -> bytes:
+        page = kwargs.get("page")
+        if self.disk_cache is not None:
+            body = await self.disk_cache.get_async(url, page)
+            if body is not None:
+                return body
+        params = self._merge_client_params(httpx_kwargs)
+        headers, cached = self._prepare_request(url)
+        next_data = next_data and self.stream_next_data
+        response = await self._send_async(url, headers, params, next_data)
+        body = self._handle_response(url, response, cached)
+        if self.disk_cache is not None:
+            await self.disk_cache.set_async(url, body, page)
+        return body
 
     def fetch(
-        self, url: str, httpx_kwargs: Optional[dict] = None, **kwargs
-    ) -> str:
-        client_params = self._merge_client_params(httpx_kwargs)
-        with httpx.Client(**client_params) as client:
-            response = client.get(url, headers=self._get_headers(url))
-            response.raise_for_status()
-            return response.text
+        self,
+        url: str,
+        httpx_kwargs: Optional[dict] = None,
+        *,
+        next_data: bool = False,
+        **kwargs,
+    ) -> bytes:
+        page = kwargs.get("page")
+        if self.disk_cache is not None:
+            body = self.disk_cache.get(url, page)
+            if body is not None:
+                return body
+        params = self._merge_client_params(httpx_kwargs)
+        headers, cached = self._prepare_request(url)
+        next_data = next_data and self.stream_next_data
+        response = self._send(url, headers, params, next_data)
+        body = self._handle_response(url, response, cached)
+        if self.disk_cache is not None:
+            self.disk_cache.set(url, body, page)
+        return body
+
+    def close(self) -> None:
+        """Close all sync connection pools.
+
+        Async pools can only be closed from their event loop,
+        see :meth:`aclose`.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Close all connection pools of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.pop(loop, {})
+        for client in clients.values():
+            await client.aclose()
+        self.close()
+
+    def __enter__(self) -> "HTTPClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "HTTPClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
 
 
 _http_client = HTTPClient()
 
+
+def get_http_client() -> HTTPClient:
+    """Get the HTTP client used by the module level functions."""
+    return _http_client
+
+
+def set_http_client(client: HTTPClient) -> None:
+    """Set the HTTP client used by the module level functions."""
+    global _http_client
+    _http_client = client
+
+
+IMDB_URL = "https://www.imdb.com"
+GRAPHQL_URL = "https://caching.graphql.imdb.com"
+
+_base_urls: dict[str, str] = {}
+
+
+def set_base_url(
+    url: Optional[str], *, graphql_url: Optional[str] = None
+) -> None:
+    """Send the requests for the IMDb servers to other servers.
+
+    Requests for the web pages go to ``url``, and GraphQL requests
+    go to ``graphql_url``, or to ``url`` if not given.
+    Pass ``None`` to go back to the IMDb servers.
+    """
+    _base_urls.clear()
+    if url is not None:
+        _base_urls[IMDB_URL] = url.rstrip("/")
+        _base_urls[GRAPHQL_URL] = (graphql_url or url).rstrip("/")
+
+
+def _rewrite_url(url: str) -> str:
+    for origin, base_url in _base_urls.items():
+        if url.startswith(origin + "/"):
+            return base_url + url[len(origin) :]
+    return url
+
+
+def _fetch(url: str, **kwargs) -> bytes:
+    return _http_client.fetch(_rewrite_url(url), **kwargs)
+
+
+async def _fetch_async(url: str, **kwargs) -> bytes:
+    return await _http_client.fetch_async(_rewrite_url(url), **kwargs)
+
+
+_title_cache: Optional[TitleCache] = None
+
+
+def set_title_cache(cache: Optional[TitleCache]) -> None:
+    """Set the cache for titles retrieved by :func:`get_title`.
+
+    Pass ``None`` to disable caching.
+    """
+    global _title_cache
+    _title_cache = cache
+
+
+def _title_key(imdb_id: str, page: str, kwargs: dict) -> tuple:
+    return (imdb_id, page, repr(sorted(kwargs.items())))
+
+
+# Concurrent requests for the same title share a single fetch and parse.
+# The number of fetches saved is counted in title_flight.saved.
+title_flight = SingleFlight(copy=copy.deepcopy)
+
+
 registry.update_preprocessors(piculet.preprocessors)
 registry.update_postprocessors(piculet.postprocessors)
 registry.update_transformers(piculet.transformers)
@@ -109,19 +694,36 @@ def get_title(
     **kwargs,
 ) -> model.Title | None:
     """Get title information synchronously."""
-    operation = GetTitle(_http_client.fetch)
-    try:
-        return operation.execute(
-            _spec(f"title_{page}"),
-            imdb_id=imdb_id,
-            httpx_kwargs=httpx_kwargs,
-            page=page,
-            **kwargs,
+    key = _title_key(imdb_id, page, kwargs)
+    cache = _title_cache
+    if cache is not None:
+        title = cache.get(key)
+        if title is not None:
+            return title
+
+    def fetch_title() -> model.Title | None:
+        operation = GetTitle(
+            _fetch,
+            document_cache=_http_client.document_cache,
         )
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == HTTPStatus.NOT_FOUND:
-            return None
-        raise
+        try:
+            title = operation.execute(
+                _spec(f"title_{page}"),
+                imdb_id=imdb_id,
+                httpx_kwargs=httpx_kwargs,
+                page=page,
+                **kwargs,
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == HTTPStatus.NOT_FOUND:
+                return None
+            raise
+        if (cache is not None) and (title is not None):
+            cache.set(key, title)
+        return title
+
+    title, _ = title_flight.do(key, fetch_title)
+    return title
 
 
 async def get_title_async(
@@ -132,19 +734,147 @@ async def get_title_async(
     **kwargs,
 ) -> model.Title | None:
     """Get title information asynchronously."""
-    operation = GetTitle(_http_client.fetch_async)
-    try:
-        return await operation.execute_async(
-            _spec(f"title_{page}"),
-            imdb_id=imdb_id,
-            httpx_kwargs=httpx_kwargs,
-            page=page,
-            **kwargs,
+    key = _title_key(imdb_id, page, kwargs)
+    cache = _title_cache
+    if cache is not None:
+        title = cache.get(key)
+        if title is not None:
+            return title
+
+    async def fetch_title() -> model.Title | None:
+        operation = GetTitle(
+            _fetch_async,
+            document_cache=_http_client.document_cache,
         )
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == HTTPStatus.NOT_FOUND:
-            return None
-        raise
+        try:
+            title = await operation.execute_async(
+                _spec(f"title_{page}"),
+                imdb_id=imdb_id,
+                httpx_kwargs=httpx_kwargs,
+                page=page,
+                **kwargs,
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == HTTPStatus.NOT_FOUND:
+                return None
+            raise
+        if (cache is not None) and (title is not None):
+            cache.set(key, title)
+        return title
+
+    title, _ = await title_flight.do_async(key, fetch_title)
+    return title
+
+
+async def get_titles_async(
+    imdb_ids: Iterable[str],
+    *,
+    page: TitlePage = "reference",
+    max_concurrency: int = 10,
+    httpx_kwargs: Optional[dict] = None,
+    **kwargs,
+) -> AsyncIterator[tuple[str, model.Title | None | Exception]]:
+    """
+    Get information for many titles asynchronously.
+
+    IMDb ids are consumed lazily, and at most ``max_concurrency`` titles
+    are fetched at any time. Results are yielded as they complete, which
+    is not necessarily in the order of the ids.
+
+    Args:
+        imdb_ids: IMDb ids of the titles
+        page: Page to get the titles from
+        max_concurrency: Maximum number of titles to fetch at once
+        httpx_kwargs: Optional HTTPX client parameters
+
+    Yields:
+        IMDb id, and the title, None if it wasn't found,
+        or the exception that was raised while getting it
+    """
+    if max_concurrency < 1:
+        raise ValueError("Concurrency must be at least 1.")
+
+    async def fetch_title(
+        imdb_id: str,
+    ) -> tuple[str, model.Title | None | Exception]:
+        try:
+            title = await get_title_async(
+                imdb_id, page=page, httpx_kwargs=httpx_kwargs, **kwargs
+            )
+        except Exception as e:
+            return imdb_id, e
+        return imdb_id, title
+
+    ids = iter(imdb_ids)
+    pending = {
+        asyncio.create_task(fetch_title(imdb_id))
+        for imdb_id in itertools.islice(ids, max_concurrency)
+    }
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for imdb_id in itertools.islice(ids, len(done)):
+                pending.add(asyncio.create_task(fetch_title(imdb_id)))
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _seasons_of(title: model.Title | None) -> list[int | str] | None:
+    seasons = getattr(title, "seasons", None)
+    if seasons:
+        return seasons
+    season_count = getattr(title, "season_count", None)
+    if season_count is not None:
+        return list(range(1, season_count + 1))
+    return None
+
+
+def _get_seasons(
+    title: model.Title, httpx_kwargs: Optional[dict]
+) -> list[int | str] | None:
+    """Get the season numbers of a series.
+
+    The numbers are taken from the main page, since seasons can have gaps
+    or be numbered by year. The season count is only used if the page
+    doesn't list the seasons.
+    """
+    seasons = getattr(title, "seasons", None)
+    if seasons:
+        return seasons
+    main = get_title(title.imdb_id, page="main", httpx_kwargs=httpx_kwargs)
+    return _seasons_of(main) or _seasons_of(title)
+
+
+async def _get_seasons_async(
+    title: model.Title, httpx_kwargs: Optional[dict]
+) -> list[int | str] | None:
+    """Get the season numbers of a series asynchronously."""
+    seasons = getattr(title, "seasons", None)
+    if seasons:
+        return seasons
+    main = await get_title_async(
+        title.imdb_id, page="main", httpx_kwargs=httpx_kwargs
+    )
+    return _seasons_of(main) or _seasons_of(title)
+
+
+def _season_params(
+    page: TitleUpdatePage, season: int | str
+) -> dict[str, Any]:
+    params: dict[str, Any] = {"season": season}
+    if page == "episodes_with_pagination":
+        params.update({"filter_type": "season", "paginate_result": True})
+    return params
+
+
+def _season_scratch(title: model.Title) -> model.Title:
+    """Make an empty title to collect the episodes of a season."""
+    return type(title)(imdb_id=title.imdb_id, title=title.title)
 
 
 def update_title(
@@ -155,10 +885,53 @@ def update_title(
     keys: list[str],
     httpx_kwargs: Optional[dict] = None,
     paginate_result: bool = False,
+    by_season: bool = False,
+    max_concurrency: int = 4,
+    max_pages: Optional[int] = None,
+    max_items: Optional[int] = None,
     **kwargs,
 ) -> None:
-    """Update title with additional information synchronously."""
-    operation = UpdateTitle(_http_client.fetch, title, keys)
+    """Update title with additional information synchronously.
+
+    With ``by_season`` set on an episodes page, the seasons of the series
+    are fetched in parallel, at most ``max_concurrency`` at a time,
+    and their episodes are added in season order.
+
+    Paginated results stop after ``max_pages`` pages or ``max_items``
+    items, for each season when fetching by season.
+    """
+    if by_season and (page in ("episodes", "episodes_with_pagination")):
+        if max_concurrency < 1:
+            raise ValueError("Concurrency must be at least 1.")
+        seasons = _get_seasons(title, httpx_kwargs)
+        if seasons is not None:
+
+            def update_season(season: int | str) -> model.Title:
+                scratch = _season_scratch(title)
+                update_title(
+                    scratch,
+                    page=page,
+                    keys=keys,
+                    httpx_kwargs=httpx_kwargs,
+                    max_pages=max_pages,
+                    max_items=max_items,
+                    **(kwargs | _season_params(page, season)),
+                )
+                return scratch
+
+            with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                for scratch in executor.map(update_season, seasons):
+                    title.add_episodes(scratch.episodes)  # type: ignore
+            return
+
+    operation = UpdateTitle(
+        _fetch,
+        title,
+        keys,
+        max_pages=max_pages,
+        max_items=max_items,
+        document_cache=_http_client.document_cache,
+    )
     operation.execute(
         _spec(f"title_{page}"),
         imdb_id=title.imdb_id,
@@ -177,9 +950,57 @@ async def update_title_async(
     keys: list[str],
     httpx_kwargs: Optional[dict] = None,
     paginate_result: bool = False,
+    by_season: bool = False,
+    max_concurrency: int = 4,
+    max_pages: Optional[int] = None,
+    max_items: Optional[int] = None,
     **kwargs,
 ) -> None:
-    operation = UpdateTitle(_http_client.fetch_async, title, keys)
+    """Update title with additional information asynchronously.
+
+    With ``by_season`` set on an episodes page, the seasons of the series
+    are fetched concurrently, at most ``max_concurrency`` at a time,
+    and their episodes are added in season order.
+
+    Paginated results stop after ``max_pages`` pages or ``max_items``
+    items, for each season when fetching by season.
+    """
+    if by_season and (page in ("episodes", "episodes_with_pagination")):
+        if max_concurrency < 1:
+            raise ValueError("Concurrency must be at least 1.")
+        seasons = await _get_seasons_async(title, httpx_kwargs)
+        if seasons is not None:
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def update_season(season: int | str) -> model.Title:
+                scratch = _season_scratch(title)
+                async with semaphore:
+                    await update_title_async(
+                        scratch,
+                        page=page,
+                        keys=keys,
+                        httpx_kwargs=httpx_kwargs,
+                        max_pages=max_pages,
+                        max_items=max_items,
+                        **(kwargs | _season_params(page, season)),
+                    )
+                return scratch
+
+            scratches = await asyncio.gather(
+                *[update_season(season) for season in seasons]
+            )
+            for scratch in scratches:
+                title.add_episodes(scratch.episodes)  # type: ignore
+            return
+
+    operation = UpdateTitle(
+        _fetch_async,
+        title,
+        keys,
+        max_pages=max_pages,
+        max_items=max_items,
+        document_cache=_http_client.document_cache,
+    )
     await operation.execute_async(
         _spec(f"title_{page}"),
         imdb_id=title.imdb_id,
@@ -199,6 +1020,7 @@ def search_titles(
     count: int = 50,
     total_count: Optional[int] = 250,
     paginate: bool = False,
+    pipeline: bool = False,
 ) -> List[model.Title]:
     """
     Search for titles on IMDb with advanced filtering options.
@@ -211,12 +1033,17 @@ def search_titles(
         count: Maximum number of items to fetch in a single request
         total_count: Total number of items to fetch
         paginate: Whether to fetch all pages of results
+        pipeline: Whether to fetch the next page while parsing the current one
 
     Returns:
         List of Title objects
     """
     operation = SearchTitles(
-        _http_client.fetch, paginate=paginate, target_count=total_count
+        _fetch,
+        paginate=paginate,
+        target_count=total_count,
+        pipeline=pipeline,
+        document_cache=_http_client.document_cache,
     )
     return operation.execute(
         _spec("title_search"),
@@ -225,6 +1052,7 @@ def search_titles(
         sort=sort,
         httpx_kwargs=httpx_kwargs,
         count=min(count, 100),
+        page="search",
         pagination_spec=_spec("title_search_with_pagination"),
     )
 
@@ -238,6 +1066,7 @@ async def search_titles_async(
     count: int = 50,
     total_count: Optional[int] = 250,
     paginate: bool = False,
+    pipeline: bool = False,
 ) -> List[model.Title]:
     """
     Asynchronous Search for titles on IMDb with advanced filtering options.
@@ -250,12 +1079,17 @@ async def search_titles_async(
         count: Maximum number of items to fetch in a single request
         total_count: Total number of items to fetch
         paginate: Whether to fetch all pages of results
+        pipeline: Whether to fetch the next page while parsing the current one
 
     Returns:
         List of Title objects
     """
     operation = SearchTitles(
-        _http_client.fetch_async, paginate=paginate, target_count=total_count
+        _fetch_async,
+        paginate=paginate,
+        target_count=total_count,
+        pipeline=pipeline,
+        document_cache=_http_client.document_cache,
     )
     return await operation.execute_async(
         _spec("title_search"),
@@ -264,5 +1098,109 @@ async def search_titles_async(
         sort=sort,
         httpx_kwargs=httpx_kwargs,
         count=min(count, 100),
+        page="search",
+        pagination_spec=_spec("title_search_with_pagination"),
+    )
+
+
+def iter_search_titles(
+    query: str = "",
+    *,
+    filters: Optional[model.SearchFilters] = None,
+    sort: model.SortCriteria = model.SortCriteria(model.SortField.POPULARITY),
+    httpx_kwargs: Optional[dict] = None,
+    count: int = 50,
+    total_count: Optional[int] = None,
+    paginate: bool = True,
+    pipeline: bool = False,
+) -> Iterator[model.Title]:
+    """
+    Search for titles on IMDb, yielding results as pages arrive.
+
+    Only one page of results is kept in memory at a time. The next page
+    is fetched when the titles of the current page are consumed.
+
+    Args:
+        query: Search query string
+        filters: Search filters including title types, genres, etc.
+        sort: Sort criteria for results
+        httpx_kwargs: Optional HTTPX client parameters
+        count: Maximum number of items to fetch in a single request
+        total_count: Total number of items to fetch, None for all
+        paginate: Whether to fetch all pages of results
+        pipeline: Whether to fetch the next page while parsing the current one
+
+    Yields:
+        Title objects
+    """
+    operation = SearchTitles(
+        _fetch,
+        paginate=paginate,
+        target_count=total_count,
+        pipeline=pipeline,
+        document_cache=_http_client.document_cache,
+    )
+    pages = operation.iter_execute(
+        _spec("title_search"),
+        query=query,
+        filters=filters,
+        sort=sort,
+        httpx_kwargs=httpx_kwargs,
+        count=min(count, 100),
+        page="search",
+        pagination_spec=_spec("title_search_with_pagination"),
+    )
+    for titles in pages:
+        yield from titles
+
+
+async def iter_search_titles_async(
+    query: str = "",
+    *,
+    filters: Optional[model.SearchFilters] = None,
+    sort: model.SortCriteria = model.SortCriteria(model.SortField.POPULARITY),
+    httpx_kwargs: Optional[dict] = None,
+    count: int = 50,
+    total_count: Optional[int] = None,
+    paginate: bool = True,
+    pipeline: bool = False,
+) -> AsyncIterator[model.Title]:
+    """
+    Asynchronously search for titles on IMDb, yielding results as pages arrive.
+
+    Only one page of results is kept in memory at a time. The next page
+    is fetched when the titles of the current page are consumed.
+
+    Args:
+        query: Search query string
+        filters: Search filters including title types, genres, etc.
+        sort: Sort criteria for results
+        httpx_kwargs: Optional HTTPX client parameters
+        count: Maximum number of items to fetch in a single request
+        total_count: Total number of items to fetch, None for all
+        paginate: Whether to fetch all pages of results
+        pipeline: Whether to fetch the next page while parsing the current one
+
+    Yields:
+        Title objects
+    """
+    operation = SearchTitles(
+        _fetch_async,
+        paginate=paginate,
+        target_count=total_count,
+        pipeline=pipeline,
+        document_cache=_http_client.document_cache,
+    )
+    pages = operation.iter_execute_async(
+        _spec("title_search"),
+        query=query,
+        filters=filters,
+        sort=sort,
+        httpx_kwargs=httpx_kwargs,
+        count=min(count, 100),
+        page="search",
         pagination_spec=_spec("title_search_with_pagination"),
     )
+    async for titles in pages:
+        for title in titles:
+            yield title
@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+
+# Compare evaluating the JMESPath expressions of the specs with the
+# jmespath interpreter against the direct lookups of MapPath.
+#
+# usage: bench_map_paths.py [spec ...]
+#
+# Without arguments, the paths of all specs are measured. Every path
+# is applied to a synthetic document that has a value for it.
+
+import sys
+import timeit
+from typing import Any
+
+from jmespath import compile as compile_jmespath
+
+from cinemagoerng import piculet, web
+
+
+def make_document(node: dict[str, Any]) -> Any:
+    """Build a document in which the expression finds a value."""
+    match node["type"]:
+        case "field":
+            return {node["value"]: "value"}
+        case "subexpression":
+            document: Any = "value"
+            for child in reversed(node["children"]):
+                inner = make_document(child)
+                document = _replace_leaf(inner, document)
+            return document
+        case "projection" | "index_expression":
+            left = make_document(node["children"][0])
+            right = make_document(node["children"][1])
+            return _replace_leaf(left, [right] * 10)
+    return "value"
+
+
+def _replace_leaf(document: Any, leaf: Any) -> Any:
+    if isinstance(document, dict):
+        return {k: _replace_leaf(v, leaf) for k, v in document.items()}
+    if isinstance(document, list):
+        return [_replace_leaf(item, leaf) for item in document]
+    return leaf
+
+
+def map_paths(rules: list) -> list[piculet.MapPath]:
+    paths = []
+    for rule in rules:
+        candidates = [
+            rule.foreach,
+            rule.extractor.foreach,
+            getattr(rule.extractor, "path", None),
+        ]
+        if not isinstance(rule.key, str):
+            candidates.append(rule.key.path)
+        paths.extend(p for p in candidates if isinstance(p, piculet.MapPath))
+        paths.extend(map_paths(getattr(rule.extractor, "rules", [])))
+    return paths
+
+
+def main(argv: list[str]) -> None:
+    names = argv or sorted(p.stem for p in web.SPECS_DIR.glob("*.json"))
+    paths = {
+        path.path: path
+        for name in names
+        for path in map_paths(web._spec(name).rules)
+    }
+
+    total_slow = total_fast = 0.0
+    n = 2000
+    for text, path in sorted(paths.items()):
+        document = make_document(path._parsed)
+        search = compile_jmespath(text).search
+        assert path.apply(document) == search(document)
+        slow = min(timeit.repeat(lambda: search(document), number=n)) / n
+        fast = min(timeit.repeat(lambda: path.apply(document), number=n))
+        fast /= n
+        total_slow += slow
+        total_fast += fast
+        direct = piculet._compile_simple(path._parsed) is not None
+        print(
+            f"{text[-50:]:50}  {'direct' if direct else 'jmespath':8}"
+            f"  before {slow * 1e6:6.2f} us  after {fast * 1e6:6.2f} us"
+        )
+    print(
+        f"{len(paths)} paths"
+        f"  before {total_slow / len(paths) * 1e6:6.2f} us/path"
+        f"  after {total_fast / len(paths) * 1e6:6.2f} us/path"
+        f"  speedup {total_slow / total_fast:5.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+
+# Compare extracting the __NEXT_DATA__ payload by parsing the whole page
+# with lxml against scanning the bytes of the page.
+#
+# usage: bench_next_data.py [page.html ...]
+#
+# Without arguments, synthetic pages resembling the main, episodes,
+# taglines and search pages are used.
+
+import json
+import sys
+import timeit
+from pathlib import Path
+
+from lxml.html import HTMLParser
+from lxml.html import fromstring as parse_html
+
+from cinemagoerng.registry import find_next_data, parse_next_data
+
+
+# page: (number of markup blocks, number of items in the payload)
+SYNTHETIC_PAGES = {
+    "main": (3000, 1500),
+    "episodes": (1500, 800),
+    "taglines": (600, 300),
+    "search": (2500, 1200),
+}
+
+
+def make_page(blocks: int, items: int) -> bytes:
+    markup = "".join(
+        f'<div class="ipc-metadata-list__item"><a href="/title/tt{i:07d}/">'
+        f"Title {i}</a><span>{i % 100}</span></div>"
+        for i in range(blocks)
+    )
+    next_data = {
+        "props": {
+            "pageProps": {
+                "items": [
+                    {
+                        "id": f"tt{i:07d}",
+                        "titleText": {"text": f"Title {i}"},
+                        "plot": {"plaintext": "Lorem ipsum dolor sit amet."},
+                        "ratings": {"aggregateRating": 7.5, "votes": i},
+                    }
+                    for i in range(items)
+                ]
+            }
+        }
+    }
+    script = (
+        '<script id="__NEXT_DATA__" type="application/json">'
+        f"{json.dumps(next_data)}</script>"
+    )
+    return (
+        f"<html><head><title>IMDb</title></head><body>{markup}{script}"
+        "<script>window.tail = 1;</script></body></html>"
+    ).encode("utf-8")
+
+
+def with_lxml(document: bytes) -> dict:
+    root = parse_html(document, parser=HTMLParser(encoding="utf-8"))
+    return parse_next_data(root)  # type: ignore
+
+
+def with_scanning(document: bytes) -> dict:
+    return json.loads(find_next_data(document))  # type: ignore
+
+
+def main(argv: list[str]) -> None:
+    if len(argv) > 0:
+        pages = {Path(arg).stem: Path(arg).read_bytes() for arg in argv}
+    else:
+        pages = {
+            name: make_page(*sizes) for name, sizes in SYNTHETIC_PAGES.items()
+        }
+
+    for name, document in pages.items():
+        assert with_lxml(document) == with_scanning(document)
+        n = 20
+        slow = min(timeit.repeat(lambda: with_lxml(document), number=n)) / n
+        fast = min(timeit.repeat(lambda: with_scanning(document), number=n))
+        fast /= n
+        print(
+            f"{name:10} {len(document) // 1024:6} KiB"
+            f"  lxml {slow * 1000:8.2f} ms"
+            f"  scan {fast * 1000:8.2f} ms"
+            f"  speedup {slow / fast:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
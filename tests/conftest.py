@@ -1,104 +1,283 @@
-import hashlib
+import json
 from pathlib import Path
-from typing import Any, Optional
+
+import httpx
+import pytest
 
 import cinemagoerng.web
+from cinemagoerng.cache import DEFAULT_TTLS, DiskCache
+from cinemagoerng.mockserver import MockIMDbServer
 
 
-# Setup cache directory
 cache_dir = Path(__file__).parent / "imdb-cache"
-if not cache_dir.exists():
-    cache_dir.mkdir(parents=True, exist_ok=True)
 
+# Keep fetched pages indefinitely so that test runs don't hit IMDb again.
+disk_cache = DiskCache(
+    cache_dir,
+    max_bytes=1024 * 1024 * 1024,
+    default_ttl=None,
+    ttls=dict.fromkeys(DEFAULT_TTLS),
+)
+
+cinemagoerng.web.set_http_client(
+    cinemagoerng.web.HTTPClient(disk_cache=disk_cache)
+)
+
+
+def make_taglines_page(imdb_id: str, title: str, taglines: list[str]) -> str:
+    """Build a minimal taglines page for a movie."""
+    next_data = {
+        "props": {
+            "pageProps": {
+                "contentData": {
+                    "entityMetadata": {
+                        "id": imdb_id,
+                        "titleType": {"id": "movie"},
+                        "originalTitleText": {"text": title},
+                    },
+                    "section": {
+                        "items": [{"htmlContent": t} for t in taglines]
+                    },
+                }
+            }
+        }
+    }
+    return (
+        '<html><body><script id="__NEXT_DATA__" type="application/json">'
+        f"{json.dumps(next_data)}</script></body></html>"
+    )
 
-class CachedHTTPClient(cinemagoerng.web.HTTPClient):
-    """HTTP client with caching support for both sync and async operations."""
 
-    def _get_cache_key(self, url: str, **kwargs) -> tuple[str, Path]:
-        """Generate cache key and path for the request."""
-        imdb_id = kwargs.get("imdb_id")
-        page = kwargs.get("page")
-        doc_type = kwargs.get("doc_type", "html")
+def make_search_items(imdb_ids: list[str]) -> list[dict]:
+    return [
+        {"titleId": i, "titleType": {"id": "movie"}, "titleText": f"Title {i}"}
+        for i in imdb_ids
+    ]
+
+
+def make_search_edges(imdb_ids: list[str]) -> list[dict]:
+    return [
+        {
+            "node": {
+                "title": {
+                    "id": i,
+                    "titleType": {"id": "movie"},
+                    "titleText": {"text": f"Title {i}"},
+                }
+            }
+        }
+        for i in imdb_ids
+    ]
+
 
-        # Generate cache key
-        key = f"title_{imdb_id}_{page}" if imdb_id and page else "search"
+@pytest.fixture
+def fake_search(monkeypatch):
+    """Serve search results for ten titles, in pages of the requested size."""
+    imdb_ids = [f"tt{i:07d}" for i in range(1, 11)]
+    requests: list[httpx.Request] = []
 
-        # Remove httpx kwargs and internal params from cache key
-        cache_kwargs = {
-            k: v
-            for k, v in kwargs.items()
-            if k not in ("httpx_kwargs", "doc_type", "imdb_id", "page")
+    def handler(request):
+        requests.append(request)
+        if request.url.host == "www.imdb.com":
+            count = int(request.url.params["count"])
+            next_data = {
+                "props": {
+                    "pageProps": {
+                        "searchResults": {
+                            "titleResults": {
+                                "titleListItems": make_search_items(imdb_ids[:count]),
+                                "endCursor": str(count),
+                                "total": len(imdb_ids),
+                            }
+                        }
+                    }
+                }
+            }
+            return httpx.Response(
+                200,
+                text=f'<script id="__NEXT_DATA__">{json.dumps(next_data)}</script>',
+            )
+        variables = json.loads(request.url.params["variables"])
+        start = int(variables["after"])
+        end = start + variables["first"]
+        data = {
+            "data": {
+                "advancedTitleSearch": {
+                    "edges": make_search_edges(imdb_ids[start:end]),
+                    "pageInfo": {
+                        "hasNextPage": end < len(imdb_ids),
+                        "endCursor": str(end),
+                    },
+                }
+            }
         }
-        extra_args = [f"{k}={v}" for k, v in sorted(cache_kwargs.items())]
-        key += "_" + "_".join(extra_args) if extra_args else ""
-
-        if len(key) > 30:
-            hash_key = hashlib.md5(url.encode()).hexdigest()
-            key = f"{key[:30]}_{hash_key[:10]}"
-        key += f".{doc_type}"
-
-        cache_path = cache_dir / key
-        return key, cache_path
-
-    def _read_cache(self, cache_path: Path) -> Optional[str]:
-        """Read content from cache if available."""
-        if cache_path.exists():
-            return cache_path.read_text(encoding="utf-8")
-        return None
-
-    def _write_cache(self, cache_path: Path, content: str) -> None:
-        """Write content to cache."""
-        cache_path.write_text(content, encoding="utf-8")
-
-    def fetch(
-        self,
-        url: str,
-        **kwargs: Any,
-    ) -> str:
-        """Synchronous fetch with caching support."""
-        # Handle special test cases
-        key, cache_path = self._get_cache_key(url, **kwargs)
-        if key == "tt0000001_main.html":
-            cache_path.unlink(missing_ok=True)
-
-        # Check cache unless explicitly disabled
-        cached_content = self._read_cache(cache_path)
-        if cached_content is not None:
-            return cached_content
-
-        # Fetch content
-        content = super().fetch(url, **kwargs)
-
-        self._write_cache(cache_path, content)
-
-        return content
-
-    async def fetch_async(
-        self,
-        url: str,
-        **kwargs: Any,
-    ) -> str:
-        """Asynchronous fetch with caching support."""
-        # Handle special test cases
-        key, cache_path = self._get_cache_key(url, **kwargs)
-        if key == "tt0000001_main.html":
-            cache_path.unlink(missing_ok=True)
-
-        # Check cache unless explicitly disabled
-        if not kwargs.get("cache", True):
-            cached_content = self._read_cache(cache_path)
-            if cached_content is not None:
-                return cached_content
-
-        # Fetch content
-        content = await super().fetch_async(url, **kwargs)
-
-        # Cache content unless explicitly disabled
-        if kwargs.get("cache", True):
-            self._write_cache(cache_path, content)
-
-        return content
-
-
-# Replace original HTTP client with cached version
-cinemagoerng.web._http_client = CachedHTTPClient()
+        return httpx.Response(200, text=json.dumps(data))
+
+    client = cinemagoerng.web.HTTPClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(cinemagoerng.web, "_http_client", client)
+    yield requests
+    client.close()
+
+
+def make_episode_node(series_id: str, season: int, episode: int) -> dict:
+    return {
+        "id": f"{series_id}s{season:02}e{episode:02}",
+        "titleText": {"text": f"Episode {season}.{episode}"},
+        "titleType": {"id": "tvEpisode"},
+        "series": {
+            "displayableEpisodeNumber": {
+                "displayableSeason": {
+                    "displayableProperty": {"value": {"plainText": str(season)}}
+                },
+                "episodeNumber": {
+                    "displayableProperty": {"value": {"plainText": str(episode)}}
+                },
+            }
+        },
+    }
+
+
+def make_episodes_handler(requests: list, season_numbers=(1, 2, 3)):
+    """Serve a series with three seasons of five episodes, two per page."""
+    seasons = {s: list(range(1, 6)) for s in season_numbers}
+
+    def handler(request):
+        requests.append(request)
+        if request.url.host == "www.imdb.com":
+            next_data = {
+                "props": {
+                    "pageProps": {
+                        "aboveTheFoldData": {
+                            "id": "tt0000100",
+                            "titleType": {"id": "tvSeries"},
+                            "titleText": {"text": "Series"},
+                            "originalTitleText": {"text": "Series"},
+                        },
+                        "mainColumnData": {
+                            "episodes": {"seasons": [{"number": s} for s in seasons]}
+                        },
+                    }
+                }
+            }
+            return httpx.Response(
+                200,
+                text=f'<script id="__NEXT_DATA__">{json.dumps(next_data)}</script>',
+            )
+        variables = json.loads(request.url.params["variables"])
+        included = variables.get("filter", {}).get("includeSeasons")
+        episodes = [
+            (s, e)
+            for s, numbers in seasons.items()
+            if (included is None) or (str(s) in included)
+            for e in numbers
+        ]
+        start = 0 if variables["after"] == "null" else int(variables["after"])
+        end = start + 2
+        edges = [{"node": make_episode_node("tt0000100", s, e)} for s, e in episodes[start:end]]
+        data = {
+            "data": {
+                "title": {
+                    "episodes": {
+                        "episodes": {
+                            "edges": edges,
+                            "pageInfo": {
+                                "hasNextPage": end < len(episodes),
+                                "endCursor": str(end),
+                            },
+                        }
+                    }
+                }
+            }
+        }
+        return httpx.Response(200, text=json.dumps(data))
+
+    return handler
+
+
+@pytest.fixture
+def episodes_handler():
+    return make_episodes_handler
+
+
+@pytest.fixture
+def fake_episodes(monkeypatch):
+    requests: list[httpx.Request] = []
+    handler = make_episodes_handler(requests)
+    client = cinemagoerng.web.HTTPClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(cinemagoerng.web, "_http_client", client)
+    yield requests
+    client.close()
+
+
+@pytest.fixture
+def taglines_page():
+    return make_taglines_page
+
+
+@pytest.fixture
+def fake_imdb(monkeypatch):
+    """Serve title taglines pages without touching the network."""
+    requests: list[httpx.Request] = []
+
+    def handler(request):
+        requests.append(request)
+        imdb_id = request.url.path.split("/")[2]
+        if imdb_id == "tt0000000":
+            return httpx.Response(404)
+        page = make_taglines_page(imdb_id, f"Title {imdb_id}", ["Tagline"])
+        return httpx.Response(200, text=page)
+
+    client = cinemagoerng.web.HTTPClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(cinemagoerng.web, "_http_client", client)
+    yield requests
+    client.close()
+
+
+@pytest.fixture
+def mock_imdb(tmp_path, monkeypatch):
+    """Run a mock IMDb server with taglines, search and episode fixtures."""
+    for i in range(1, 11):
+        imdb_id = f"tt{i:07d}"
+        title_dir = tmp_path / "title" / imdb_id
+        title_dir.mkdir(parents=True)
+        page = make_taglines_page(imdb_id, f"Title {imdb_id}", ["Tagline"])
+        (title_dir / "taglines.html").write_text(page)
+
+    imdb_ids = [f"tt{i:07d}" for i in range(1, 11)]
+    next_data = {
+        "props": {
+            "pageProps": {
+                "searchResults": {
+                    "titleResults": {
+                        "titleListItems": make_search_items(imdb_ids[:3]),
+                        "endCursor": "3",
+                        "total": len(imdb_ids),
+                    }
+                }
+            }
+        }
+    }
+    (tmp_path / "search").mkdir()
+    (tmp_path / "search" / "title.html").write_text(
+        f'<script id="__NEXT_DATA__">{json.dumps(next_data)}</script>'
+    )
+
+    graphql_dir = tmp_path / "graphql"
+    (graphql_dir / "TitleEpisodesSubPagePagination").mkdir(parents=True)
+    search = {"data": {"advancedTitleSearch": {"edges": make_search_edges(imdb_ids)}}}
+    (graphql_dir / "AdvancedTitleSearch.json").write_text(json.dumps(search))
+    for season in [1, 2, 3]:
+        nodes = [make_episode_node("tt0000100", season, e) for e in range(1, 6)]
+        episodes = {"data": {"title": {"episodes": {"episodes": {"edges": [{"node": n} for n in nodes]}}}}}
+        path = graphql_dir / "TitleEpisodesSubPagePagination" / f"tt0000100-season{season}.json"
+        path.write_text(json.dumps(episodes))
+
+    client = cinemagoerng.web.HTTPClient()
+    monkeypatch.setattr(cinemagoerng.web, "_http_client", client)
+    with MockIMDbServer(tmp_path, seed=42) as server:
+        cinemagoerng.web.set_base_url(server.url)
+        try:
+            yield server
+        finally:
+            cinemagoerng.web.set_base_url(None)
+            client.close()
@@ -0,0 +1,96 @@
+import asyncio
+import gzip
+import os
+import time
+
+import httpx
+
+from cinemagoerng import web
+from cinemagoerng.cache import DEFAULT_TTLS, DiskCache
+
+
+URL = "https://www.imdb.com/title/tt0133093/"
+
+
+def test_disk_cache_should_return_stored_document(tmp_path):
+    cache = DiskCache(tmp_path)
+    cache.set(URL, b"<html>The Matrix</html>", page="main")
+    assert cache.get(URL, page="main") == b"<html>The Matrix</html>"
+    assert cache.stats == {"hits": 1, "misses": 0, "evictions": 0}
+
+
+def test_disk_cache_should_store_compressed_documents(tmp_path):
+    cache = DiskCache(tmp_path)
+    cache.set(URL, b"x" * 10000)
+    [path] = tmp_path.glob("*/*.gz")
+    assert path.stat().st_size < 1000
+    assert gzip.decompress(path.read_bytes()).endswith(b"x" * 10000)
+
+
+def test_disk_cache_should_expire_documents_by_page(tmp_path):
+    cache = DiskCache(tmp_path, ttls={"search": 0.0, "akas": None})
+    cache.set(URL, b"search results", page="search")
+    cache.set(URL + "akas", b"akas", page="akas")
+    time.sleep(0.01)
+    assert cache.get(URL, page="search") is None
+    assert cache.get(URL + "akas", page="akas") == b"akas"
+
+
+def test_disk_cache_should_keep_default_ttls_of_other_pages(tmp_path):
+    cache = DiskCache(tmp_path, ttls={"search": 600})
+    assert cache._ttl("search") == 600
+    assert cache._ttl("akas") == DEFAULT_TTLS["akas"]
+
+
+def test_disk_cache_should_evict_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=3500, compresslevel=0)
+    for i in range(3):
+        cache.set(f"{URL}{i}", b"x" * 800)
+        path = cache._path(f"{URL}{i}")
+        os.utime(path, (i, i))
+    cache.get(f"{URL}0")  # now the most recently used
+    cache.set(f"{URL}3", b"x" * 800)
+    assert cache.get(f"{URL}0") is not None
+    assert cache.get(f"{URL}1") is None
+    assert cache.evictions > 0
+
+
+def test_disk_cache_should_not_leave_temporary_files(tmp_path):
+    cache = DiskCache(tmp_path)
+    cache.set(URL, b"a")
+    cache.set(URL, b"b")
+    assert [p.suffix for p in tmp_path.glob("*/*")] == [".gz"]
+    assert cache.get(URL) == b"b"
+
+
+def test_fetch_should_use_disk_cache(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, text="<html></html>")
+
+    cache = DiskCache(tmp_path)
+    transport = httpx.MockTransport(handler)
+    with web.HTTPClient(disk_cache=cache, transport=transport) as client:
+        client.fetch(URL, page="main")
+        assert client.fetch(URL, page="main") == b"<html></html>"
+    assert len(requests) == 1
+
+
+def test_fetch_async_should_use_disk_cache(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, text="<html></html>")
+
+    async def run():
+        cache = DiskCache(tmp_path)
+        transport = httpx.MockTransport(handler)
+        async with web.HTTPClient(disk_cache=cache, transport=transport) as client:
+            await client.fetch_async(URL, page="main")
+            return await client.fetch_async(URL, page="main")
+
+    assert asyncio.run(run()) == b"<html></html>"
+    assert len(requests) == 1
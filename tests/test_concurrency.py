@@ -0,0 +1,263 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cinemagoerng.concurrency import (
+    AdaptiveLimiter,
+    RateLimiter,
+    SingleFlight,
+    TokenBucket,
+)
+
+
+def test_single_flight_should_share_result_between_threads():
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    def call():
+        results.append(flight.do("key", work))
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(results) == [("result", False)] + [("result", True)] * 4
+    assert flight.saved == 4
+
+
+def test_single_flight_should_share_result_between_tasks():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*[flight.do_async("key", work) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert [r[0] for r in results] == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.saved == 4
+
+
+def test_single_flight_should_share_exception_between_tasks():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    async def run():
+        calls = [flight.do_async("key", work) for _ in range(3)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_single_flight_should_not_share_finished_calls():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == (1, False)
+    assert flight.do("key", lambda: 2) == (2, False)
+    assert flight.saved == 0
+
+
+def test_single_flight_should_keep_running_if_a_waiter_is_cancelled():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def run():
+        first = asyncio.create_task(flight.do_async("key", work))
+        second = asyncio.create_task(flight.do_async("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == ("result", True)
+
+
+def test_single_flight_should_not_copy_result_without_waiters():
+    copies = []
+    flight = SingleFlight(copy=lambda r: copies.append(r) or list(r))
+    result = ["result"]
+    assert flight.do("key", lambda: result)[0] is result
+    assert copies == []
+
+
+def test_single_flight_should_give_copies_to_waiters_between_threads():
+    flight = SingleFlight(copy=list)
+    result = ["result"]
+    results = []
+
+    def work():
+        time.sleep(0.1)
+        return result
+
+    def call():
+        value, joined = flight.do("key", work)
+        if not joined:
+            value.append("changed")
+        results.append((value, joined))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(joined for _, joined in results) == [False, True, True]
+    for value, joined in results:
+        assert (value is result) is not joined
+        assert value == (["result"] if joined else ["result", "changed"])
+
+
+def test_single_flight_should_give_copies_to_waiters_between_tasks():
+    flight = SingleFlight(copy=list)
+    result = ["result"]
+
+    async def work():
+        await asyncio.sleep(0.01)
+        return result
+
+    async def first():
+        value, joined = await flight.do_async("key", work)
+        value.append("changed")
+        return value, joined
+
+    async def run():
+        return await asyncio.gather(
+            first(), flight.do_async("key", work), flight.do_async("key", work)
+        )
+
+    (leader, _), *waiters = asyncio.run(run())
+    assert leader is result
+    assert leader == ["result", "changed"]
+    assert waiters == [(["result"], True)] * 2
+    assert waiters[0][0] is not waiters[1][0]
+
+
+def test_token_bucket_should_allow_burst():
+    bucket = TokenBucket(rate=10.0, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_token_bucket_should_reject_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0.0)
+
+
+def test_rate_limiter_should_keep_separate_buckets_per_host():
+    limiter = RateLimiter(rate=1.0, hosts={"caching.graphql.imdb.com": (1.0, 2)})
+    assert not limiter.reserve("www.imdb.com")
+    assert limiter.reserve("www.imdb.com") > 0.0
+    assert not limiter.reserve("caching.graphql.imdb.com")
+    assert not limiter.reserve("caching.graphql.imdb.com")
+
+
+def test_rate_limiter_should_space_out_threads():
+    limiter = RateLimiter(rate=50.0)
+    times = []
+
+    def call():
+        limiter.acquire("www.imdb.com")
+        times.append(time.monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(times) - start >= 0.07
+
+
+def test_rate_limiter_should_space_out_tasks():
+    limiter = RateLimiter(rate=50.0)
+
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*[limiter.acquire_async("www.imdb.com") for _ in range(5)])
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.07
+
+
+def test_adaptive_limiter_should_increase_limit_on_success():
+    limiter = AdaptiveLimiter(initial=2, max_limit=4)
+    for _ in range(10):
+        limiter.record(0.1, 200)
+    assert limiter.limit == 4
+
+
+def test_adaptive_limiter_should_decrease_limit_on_throttling():
+    limiter = AdaptiveLimiter(initial=8)
+    limiter.record(0.1, 429)
+    assert limiter.limit == 4
+    assert limiter.stats["decreases"] == 1
+
+
+def test_adaptive_limiter_should_decrease_limit_once_for_burst_without_baseline():
+    limiter = AdaptiveLimiter(initial=64)
+    for _ in range(5):
+        limiter.record(1.0, 429)
+    assert limiter.limit == 32
+    assert limiter.stats["decreases"] == 1
+
+
+def test_adaptive_limiter_should_decrease_limit_again_after_round_trip():
+    limiter = AdaptiveLimiter(initial=64)
+    limiter.record(0.0, 429)
+    limiter.record(0.0, 503)
+    assert limiter.limit == 16
+
+
+def test_adaptive_limiter_should_decrease_limit_on_failure():
+    limiter = AdaptiveLimiter(initial=8, min_limit=6)
+    limiter.record(0.1)
+    assert limiter.limit == 6
+
+
+def test_adaptive_limiter_should_decrease_limit_on_rising_latency():
+    limiter = AdaptiveLimiter(initial=8, max_limit=8, window=10)
+    for _ in range(10):
+        limiter.record(0.001, 200)
+    assert limiter.limit == 8
+    limiter.record(1.0, 200)
+    assert limiter.limit == 4
+
+
+def test_adaptive_limiter_should_cap_concurrency():
+    limiter = AdaptiveLimiter(initial=2, max_limit=2)
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*[work() for _ in range(6)])
+
+    asyncio.run(run())
+    assert peak == 2
+    assert limiter.in_flight == 0
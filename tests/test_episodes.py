@@ -0,0 +1,182 @@
+import asyncio
+import gc
+import weakref
+from collections import UserDict
+
+import httpx
+import pytest
+
+from cinemagoerng import model, operations, web
+
+
+def make_series(season_count=None, seasons=()):
+    return model.TVSeries(
+        imdb_id="tt0000100", title="Series", season_count=season_count, seasons=list(seasons)
+    )
+
+
+def episode_keys(series):
+    return [(ep.season, ep.episode) for ep in series.episodes]
+
+
+ALL_EPISODES = [(s, e) for s in range(1, 4) for e in range(1, 6)]
+
+
+def test_update_title_should_paginate_episodes(fake_episodes):
+    series = make_series()
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], paginate_result=True)
+    assert episode_keys(series) == ALL_EPISODES
+    assert len(fake_episodes) == 8
+
+
+def test_update_title_by_season_should_fetch_all_seasons(fake_episodes):
+    series = make_series(seasons=[1, 2, 3])
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], by_season=True, max_concurrency=2)
+    assert episode_keys(series) == ALL_EPISODES
+    assert len(fake_episodes) == 9
+
+
+def test_update_title_by_season_should_discover_seasons(fake_episodes):
+    series = make_series()
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], by_season=True)
+    assert episode_keys(series) == ALL_EPISODES
+    assert fake_episodes[0].url.host == "www.imdb.com"
+
+
+@pytest.fixture
+def fake_odd_seasons(monkeypatch, episodes_handler):
+    requests = []
+    handler = episodes_handler(requests, season_numbers=(1, 3, 2024))
+    client = web.HTTPClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(web, "_http_client", client)
+    yield requests
+    client.close()
+
+
+def test_update_title_by_season_should_use_listed_season_numbers(fake_odd_seasons):
+    series = make_series(season_count=2024)
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], by_season=True)
+    assert episode_keys(series) == [(s, e) for s in (1, 3, 2024) for e in range(1, 6)]
+    assert len(fake_odd_seasons) == 1 + 3 * 3
+
+
+def test_update_title_async_by_season_should_use_listed_season_numbers(fake_odd_seasons):
+    series = make_series()
+    asyncio.run(
+        web.update_title_async(series, page="episodes_with_pagination", keys=["episodes"], by_season=True)
+    )
+    assert episode_keys(series) == [(s, e) for s in (1, 3, 2024) for e in range(1, 6)]
+
+
+def test_update_title_by_season_should_fall_back_to_season_count(monkeypatch, fake_episodes):
+    monkeypatch.setattr(web, "get_title", lambda *args, **kwargs: None)
+    series = make_series(season_count=3)
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], by_season=True)
+    assert episode_keys(series) == ALL_EPISODES
+    assert len(fake_episodes) == 9
+
+
+def test_update_title_by_season_should_require_concurrency(fake_episodes):
+    series = make_series(seasons=[1, 2, 3])
+    with pytest.raises(ValueError):
+        web.update_title(series, page="episodes", keys=["episodes"], by_season=True, max_concurrency=0)
+
+
+def test_update_title_async_by_season_should_require_concurrency(fake_episodes):
+    series = make_series(seasons=[1, 2, 3])
+    with pytest.raises(ValueError):
+        asyncio.run(
+            web.update_title_async(
+                series, page="episodes", keys=["episodes"], by_season=True, max_concurrency=0
+            )
+        )
+    assert len(fake_episodes) == 0
+
+
+def test_update_title_async_by_season_should_fetch_all_seasons(fake_episodes):
+    series = make_series(seasons=[1, 2, 3])
+    asyncio.run(
+        web.update_title_async(series, page="episodes_with_pagination", keys=["episodes"], by_season=True)
+    )
+    assert episode_keys(series) == ALL_EPISODES
+    assert len(fake_episodes) == 9
+
+
+def test_update_title_by_season_should_keep_existing_episodes(fake_episodes):
+    series = make_series(seasons=[1, 2, 3])
+    series.add_episodes([model.TVEpisode(imdb_id="tt0000101", title="Existing", season=1, episode=1)])
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], by_season=True)
+    assert len(series.episodes) == 15
+    assert series.episodes[0].title == "Existing"
+
+
+def test_update_title_should_stop_after_max_pages(fake_episodes):
+    series = make_series()
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], paginate_result=True, max_pages=3)
+    assert episode_keys(series) == ALL_EPISODES[:6]
+    assert len(fake_episodes) == 3
+
+
+def test_update_title_should_stop_after_max_items(fake_episodes):
+    series = make_series()
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], paginate_result=True, max_items=5)
+    assert episode_keys(series) == ALL_EPISODES[:5]
+    assert len(fake_episodes) == 3
+
+
+@pytest.fixture
+def page_refs(monkeypatch):
+    refs = []
+    fetch_data = operations.UpdateTitle._fetch_data
+    fetch_data_async = operations.UpdateTitle._fetch_data_async
+
+    def track(data):
+        # the previous pages have been merged and must be released
+        gc.collect()
+        assert all(ref() is None for ref in refs)
+        page = UserDict(data)
+        refs.append(weakref.ref(page))
+        return page
+
+    def tracking(self, spec, **kwargs):
+        return track(fetch_data(self, spec, **kwargs))
+
+    async def tracking_async(self, spec, **kwargs):
+        return track(await fetch_data_async(self, spec, **kwargs))
+
+    monkeypatch.setattr(operations.UpdateTitle, "_fetch_data", tracking)
+    monkeypatch.setattr(operations.UpdateTitle, "_fetch_data_async", tracking_async)
+    return refs
+
+
+def test_update_title_should_release_merged_pages(fake_episodes, page_refs):
+    series = make_series()
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], paginate_result=True)
+    assert episode_keys(series) == ALL_EPISODES
+    assert len(page_refs) == 8
+
+
+def test_update_title_async_should_release_merged_pages(fake_episodes, page_refs):
+    series = make_series()
+    asyncio.run(
+        web.update_title_async(series, page="episodes_with_pagination", keys=["episodes"], paginate_result=True)
+    )
+    assert episode_keys(series) == ALL_EPISODES
+    assert len(page_refs) == 8
+
+
+def test_update_title_async_should_stop_after_max_pages(fake_episodes):
+    series = make_series()
+    asyncio.run(
+        web.update_title_async(
+            series, page="episodes_with_pagination", keys=["episodes"], paginate_result=True, max_pages=2
+        )
+    )
+    assert episode_keys(series) == ALL_EPISODES[:4]
+    assert len(fake_episodes) == 2
+
+
+def test_update_title_by_season_should_cap_each_season(fake_episodes):
+    series = make_series(seasons=[1, 2, 3])
+    web.update_title(series, page="episodes_with_pagination", keys=["episodes"], by_season=True, max_items=3)
+    assert episode_keys(series) == [(s, e) for s in range(1, 4) for e in range(1, 4)]
@@ -0,0 +1,386 @@
+import asyncio
+import gzip
+import sys
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from cinemagoerng import web
+
+
+def make_client(handler, **kwargs):
+    transport = httpx.MockTransport(handler)
+    return web.HTTPClient(transport=transport, **kwargs)
+
+
+def ok(request):
+    return httpx.Response(200, text=f"<html>{request.url.path}</html>")
+
+
+def test_fetch_should_reuse_pooled_client():
+    with make_client(ok) as client:
+        assert client.fetch("https://www.imdb.com/title/tt0133093/") == (
+            b"<html>/title/tt0133093/</html>"
+        )
+        client.fetch("https://www.imdb.com/title/tt0133093/reference")
+        assert len(client._clients) == 1
+
+
+def test_fetch_should_not_create_pool_for_request_params():
+    with make_client(ok) as client:
+        client.fetch("https://www.imdb.com/", httpx_kwargs={"timeout": 5.0})
+        client.fetch("https://www.imdb.com/")
+        assert len(client._clients) == 1
+
+
+def test_close_should_release_pools():
+    client = make_client(ok)
+    client.fetch("https://www.imdb.com/")
+    client.close()
+    assert len(client._clients) == 0
+
+
+def test_fetch_async_should_drop_pools_of_closed_loops():
+    client = make_client(ok)
+    loops = []  # open connections keep their loops alive
+
+    async def run():
+        await client.fetch_async("https://www.imdb.com/")
+        loops.append(asyncio.get_running_loop())
+
+    for _ in range(5):
+        asyncio.run(run())
+    assert len(client._async_clients) == 1
+
+
+def test_fetch_should_raise_for_error_status():
+    with make_client(lambda request: httpx.Response(404)) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            client.fetch("https://www.imdb.com/title/tt0000000/")
+
+
+def test_fetch_async_should_reuse_pooled_client():
+    async def run():
+        async with make_client(ok) as client:
+            pages = await asyncio.gather(
+                client.fetch_async("https://www.imdb.com/a"),
+                client.fetch_async("https://www.imdb.com/b"),
+            )
+            loop = asyncio.get_running_loop()
+            return pages, len(client._async_clients[loop])
+
+    pages, n_clients = asyncio.run(run())
+    assert pages == [b"<html>/a</html>", b"<html>/b</html>"]
+    assert n_clients == 1
+
+
+def test_fetch_should_count_http_versions():
+    def handler(request):
+        version = b"HTTP/2" if "graphql" in request.url.host else b"HTTP/1.1"
+        return httpx.Response(200, extensions={"http_version": version})
+
+    with make_client(handler) as client:
+        client.fetch("https://www.imdb.com/")
+        client.fetch("https://caching.graphql.imdb.com/?a")
+        client.fetch("https://caching.graphql.imdb.com/?b")
+        assert client.http_versions == {"HTTP/1.1": 1, "HTTP/2": 2}
+
+
+def test_http2_should_require_h2(monkeypatch):
+    monkeypatch.setitem(sys.modules, "h2", None)
+    with pytest.raises(ImportError, match="http2"):
+        web.HTTPClient(http2=True)
+
+
+@pytest.fixture
+def built_pools(monkeypatch):
+    monkeypatch.setitem(sys.modules, "h2", types.ModuleType("h2"))
+    built = []
+
+    def recording(cls):
+        def build(**kwargs):
+            built.append((cls, kwargs))
+            return cls(**kwargs)
+
+        return build
+
+    monkeypatch.setattr(web.httpx, "Client", recording(httpx.Client))
+    monkeypatch.setattr(web.httpx, "AsyncClient", recording(httpx.AsyncClient))
+    return built
+
+
+def test_http2_should_build_pools_with_http2(built_pools):
+    with make_client(ok, http2=True) as client:
+        client.fetch("https://www.imdb.com/")
+
+        async def run():
+            await client.fetch_async("https://www.imdb.com/")
+
+        asyncio.run(run())
+    assert [cls.__name__ for cls, _ in built_pools] == ["Client", "AsyncClient"]
+    assert all(kwargs["http2"] for _, kwargs in built_pools)
+
+
+def test_pools_should_use_http1_by_default(built_pools):
+    with make_client(ok) as client:
+        client.fetch("https://www.imdb.com/")
+    assert [kwargs["http2"] for _, kwargs in built_pools] == [False]
+
+
+def test_document_cache_should_reuse_unmodified_document():
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, text="<html>v1</html>", headers={"ETag": '"v1"'})
+
+    cache = web.DocumentCache()
+    with make_client(handler, document_cache=cache) as client:
+        first = client.fetch("https://www.imdb.com/title/tt0133093/")
+        second = client.fetch("https://www.imdb.com/title/tt0133093/")
+        assert second is first
+    assert cache.stats == {"hits": 1, "misses": 1, "revalidated": 1, "parses_saved": 0}
+
+
+def test_document_cache_should_replace_modified_document():
+    versions = iter(["v1", "v2"])
+
+    def handler(request):
+        version = next(versions)
+        return httpx.Response(200, text=version, headers={"Last-Modified": version})
+
+    cache = web.DocumentCache()
+    with make_client(handler, document_cache=cache) as client:
+        assert client.fetch("https://www.imdb.com/") == b"v1"
+        assert client.fetch("https://www.imdb.com/") == b"v2"
+    assert (cache.hits, cache.misses, cache.revalidated) == (0, 2, 1)
+
+
+def test_document_cache_should_skip_scraping_unmodified_document():
+    spec = web._spec("title_taglines")
+    document = '<script id="__NEXT_DATA__">{"props": {"pageProps": {}}}</script>'
+    cache = web.DocumentCache()
+    scrapes = []
+
+    def scraper(doc, spec):
+        scrapes.append(doc)
+        return {"taglines": ["a"]}
+
+    cache.update(
+        "https://www.imdb.com/",
+        httpx.Response(200, text=document, headers={"ETag": "x"}),
+    )
+    stored = cache.lookup("https://www.imdb.com/").body
+    first = cache.scrape(stored, spec, scraper)
+    first["taglines"].append("b")
+    assert cache.scrape(stored, spec, scraper) == {"taglines": ["a"]}
+    assert len(scrapes) == 1
+    assert cache.parses_saved == 1
+
+
+def test_fetch_should_use_rate_limiter():
+    limiter = web.RateLimiter(rate=1.0, burst=2)
+    with make_client(ok, rate_limiter=limiter) as client:
+        client.fetch("https://www.imdb.com/a")
+        client.fetch("https://www.imdb.com/b")
+        assert limiter.reserve("www.imdb.com") > 0.0
+        assert not limiter.reserve("caching.graphql.imdb.com")
+
+
+def test_fetch_async_should_report_to_concurrency_limiter():
+    limiter = web.AdaptiveLimiter(initial=8)
+
+    async def run():
+        async with make_client(lambda request: httpx.Response(429), concurrency_limiter=limiter) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.fetch_async("https://www.imdb.com/")
+
+    asyncio.run(run())
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+NEXT_DATA_PAGE = [
+    b'<html><head><script id="__NEXT',
+    b'_DATA__" type="application/json">{"props": ',
+    b'{}}</scr',
+    b"ipt><script>tail()</script>",
+    b"<div>" + b"x" * 10000 + b"</div></html>",
+]
+
+HTTP2 = {"http_version": b"HTTP/2"}
+
+
+def test_next_data_scanner_should_stop_at_end_of_script():
+    scanner = web._NextDataScanner()
+    done = [scanner.feed(chunk) for chunk in NEXT_DATA_PAGE[:4]]
+    assert done == [False, False, False, True]
+    assert bytes(scanner.body).endswith(b'{"props": {}}</script>')
+
+
+def test_next_data_scanner_should_wait_for_quote_after_marker():
+    scanner = web._NextDataScanner()
+    chunks = [b'<script id="', b"__NEXT_DATA__", b'">{}</script>']
+    assert [scanner.feed(chunk) for chunk in chunks] == [False, False, True]
+
+
+def test_next_data_scanner_should_read_whole_page_for_early_marker():
+    scanner = web._NextDataScanner()
+    early = [b"<script>if(window.__NEXT_DATA__){x()}</script>"]
+    assert not any(scanner.feed(chunk) for chunk in early + NEXT_DATA_PAGE)
+    assert bytes(scanner.body) == b"".join(early + NEXT_DATA_PAGE)
+
+
+def test_fetch_should_read_whole_page_for_early_next_data_marker(taglines_page):
+    page = taglines_page("tt0133093", "The Matrix", ["Free your mind."]).encode()
+    early = b"<html><head><script>if(window.__NEXT_DATA__){x()}</script></head>"
+    page = early + page.removeprefix(b"<html>")
+
+    def handler(request):
+        return httpx.Response(200, content=iter([page[:100], page[100:]]))
+
+    with make_client(handler) as client:
+        document = client.fetch("https://www.imdb.com/", next_data=True)
+    assert document == page
+    spec = web._spec("title_taglines")
+    data = web.GetTitle(None)._scrape(document, spec)
+    assert data["taglines"] == ["Free your mind."]
+
+
+def test_fetch_should_stop_reading_after_next_data_over_http2():
+    sent = []
+
+    def chunks():
+        for chunk in NEXT_DATA_PAGE:
+            sent.append(chunk)
+            yield chunk
+
+    def handler(request):
+        return httpx.Response(200, content=chunks(), extensions=HTTP2)
+
+    with make_client(handler) as client:
+        page = client.fetch("https://www.imdb.com/title/tt0133093/", next_data=True)
+    assert page.endswith(b'{"props": {}}</script>')
+    assert len(sent) == 4
+
+
+def test_fetch_should_read_rest_of_page_after_next_data_over_http1():
+    sent = []
+
+    def chunks():
+        for chunk in NEXT_DATA_PAGE:
+            sent.append(chunk)
+            yield chunk
+
+    with make_client(lambda request: httpx.Response(200, content=chunks())) as client:
+        page = client.fetch("https://www.imdb.com/title/tt0133093/", next_data=True)
+    assert page.endswith(b'{"props": {}}</script>')
+    assert len(sent) == len(NEXT_DATA_PAGE)
+
+
+@pytest.fixture
+def keep_alive_server():
+    connections = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            page = b"".join(NEXT_DATA_PAGE)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/", connections
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_should_reuse_connection_after_next_data(keep_alive_server):
+    url, connections = keep_alive_server
+    with web.HTTPClient() as client:
+        for _ in range(3):
+            page = client.fetch(url, next_data=True)
+            assert page.endswith(b'{"props": {}}</script>')
+    assert len(connections) == 1
+
+
+def test_fetch_async_should_reuse_connection_after_next_data(keep_alive_server):
+    url, connections = keep_alive_server
+
+    async def run():
+        async with web.HTTPClient() as client:
+            for _ in range(3):
+                await client.fetch_async(url, next_data=True)
+
+    asyncio.run(run())
+    assert len(connections) == 1
+
+
+def test_fetch_should_read_whole_page_without_next_data():
+    page = b"<html><script>tail()</script></html>"
+    with make_client(lambda request: httpx.Response(200, content=page)) as client:
+        assert client.fetch("https://www.imdb.com/", next_data=True) == page
+
+
+def test_fetch_should_not_stream_when_disabled():
+    page = b"".join(NEXT_DATA_PAGE)
+
+    def handler(request):
+        return httpx.Response(200, content=page)
+
+    with make_client(handler, stream_next_data=False) as client:
+        assert client.fetch("https://www.imdb.com/", next_data=True) == page
+
+
+def test_fetch_async_should_stop_reading_after_next_data_over_http2():
+    sent = []
+
+    async def chunks():
+        for chunk in NEXT_DATA_PAGE:
+            sent.append(chunk)
+            yield chunk
+
+    async def run():
+        def handler(request):
+            return httpx.Response(200, content=chunks(), extensions=HTTP2)
+
+        async with make_client(handler) as client:
+            return await client.fetch_async("https://www.imdb.com/", next_data=True)
+
+    assert asyncio.run(run()).endswith(b"</script>")
+    assert len(sent) == 4
+
+
+def test_fetch_should_decode_compressed_next_data():
+    page = gzip.compress(b"".join(NEXT_DATA_PAGE))
+
+    def handler(request):
+        return httpx.Response(200, content=page, headers={"Content-Encoding": "gzip"})
+
+    with make_client(handler) as client:
+        assert client.fetch("https://www.imdb.com/", next_data=True).endswith(b"{}}</script>")
+
+
+def test_fetch_should_raise_for_error_status_when_streaming():
+    client = make_client(lambda request: httpx.Response(404))
+    with client, pytest.raises(httpx.HTTPStatusError):
+        client.fetch("https://www.imdb.com/", next_data=True)
+
+
+def test_get_title_should_parse_streamed_page(fake_imdb):
+    movie = web.get_title("tt0133093", page="taglines")
+    assert movie.taglines == ["Tagline"]
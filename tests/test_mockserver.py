@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from cinemagoerng import model, web
+from cinemagoerng.resilience import RetryPolicy
+
+
+def test_mock_server_should_serve_title_pages(mock_imdb):
+    movie = web.get_title("tt0000001", page="taglines")
+    assert movie.taglines == ["Tagline"]
+    assert mock_imdb.stats["requests"] == 1
+
+
+def test_mock_server_should_return_404_for_missing_fixtures(mock_imdb):
+    assert web.get_title("tt0000099", page="taglines") is None
+
+
+def test_mock_server_should_paginate_graphql_search(mock_imdb):
+    titles = list(web.iter_search_titles("", count=3))
+    assert [t.imdb_id for t in titles] == [f"tt{i:07d}" for i in range(1, 11)]
+    assert mock_imdb.stats["requests"] == 4
+
+
+def test_mock_server_should_serve_seasons(mock_imdb):
+    series = model.TVSeries(imdb_id="tt0000100", title="Series", season_count=3)
+    asyncio.run(
+        web.update_title_async(series, page="episodes_with_pagination", keys=["episodes"], by_season=True)
+    )
+    assert len(series.episodes) == 15
+
+
+def test_mock_server_should_inject_errors(mock_imdb):
+    mock_imdb.error_rate = 1.0
+    with pytest.raises(httpx.HTTPStatusError) as e:
+        web.get_title("tt0000001", page="taglines")
+    assert e.value.response.status_code == 503
+    assert mock_imdb.stats["errors"] == 1
+
+
+def test_mock_server_faults_should_be_retried(mock_imdb, monkeypatch):
+    mock_imdb.error_rate, mock_imdb.throttle_rate, mock_imdb.retry_after = 0.3, 0.3, 0
+    client = web.HTTPClient(retry_policy=RetryPolicy(max_attempts=20, backoff=0.0))
+    monkeypatch.setattr(web, "_http_client", client)
+    for i in range(1, 11):
+        assert web.get_title(f"tt{i:07d}", page="taglines").taglines == ["Tagline"]
+    assert mock_imdb.stats["errors"] > 0
+    assert mock_imdb.stats["throttled"] > 0
+    client.close()
+
+
+def test_mock_server_should_delay_responses(mock_imdb):
+    mock_imdb.latency = 0.05
+    start = time.monotonic()
+    asyncio.run(web.get_title_async("tt0000001", page="taglines"))
+    assert time.monotonic() - start >= 0.05
+
+
+def test_base_url_should_only_rewrite_imdb_urls():
+    web.set_base_url("http://localhost:8000/", graphql_url="http://localhost:8001")
+    try:
+        assert web._rewrite_url("https://www.imdb.com/title/tt0133093/") == "http://localhost:8000/title/tt0133093/"
+        assert web._rewrite_url("https://caching.graphql.imdb.com/?x=1") == "http://localhost:8001/?x=1"
+        assert web._rewrite_url("https://example.com/") == "https://example.com/"
+    finally:
+        web.set_base_url(None)
+    assert web._rewrite_url("https://www.imdb.com/") == "https://www.imdb.com/"
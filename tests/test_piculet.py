@@ -1,7 +1,9 @@
+import traceback
 from dataclasses import dataclass
 from decimal import Decimal
 from pathlib import Path
 
+import jmespath
 import pytest
 
 from cinemagoerng import piculet
@@ -106,6 +108,97 @@ def test_scrape_should_produce_scalar_text(movie, movie_spec):
     assert data == {"title": "The Shining"}
 
 
+def test_scrape_should_parse_html_bytes_as_utf8(movie_spec):
+    rule = {"key": "title", "extractor": {"path": "//p/text()"}}
+    spec = piculet.load_spec(movie_spec | {"rules": [rule]})
+    document = "<html><body><p>Amélie</p></body></html>".encode("utf-8")
+    data = piculet.scrape(document, rules=spec.rules, doctype="html")
+    assert data == {"title": "Amélie"}
+
+
+def test_scrape_should_parse_json_bytes(movie_spec):
+    rule = {"key": "title", "extractor": {"path": "title"}}
+    spec = piculet.load_spec(
+        movie_spec | {"path_type": "jmespath", "rules": [rule]}
+    )
+    document = '{"title": "Amélie"}'.encode("utf-8")
+    data = piculet.scrape(document, rules=spec.rules, doctype="json")
+    assert data == {"title": "Amélie"}
+
+
+@pytest.fixture
+def fake_json_decoder(monkeypatch):
+    calls = []
+
+    def decode(document):
+        calls.append(document)
+        return {"title": "Fake"}
+
+    monkeypatch.setitem(piculet.json_decoders, "msgspec", decode)
+    yield calls
+    monkeypatch.undo()
+    piculet.set_json_decoder()
+
+
+def test_get_json_decoder_should_raise_error_for_unknown_name():
+    with pytest.raises(ValueError):
+        piculet.get_json_decoder("simplejson")
+
+
+def test_get_json_decoder_should_fall_back_to_stdlib_if_not_installed(
+    monkeypatch,
+):
+    monkeypatch.delitem(piculet.json_decoders, "orjson", raising=False)
+    assert piculet.get_json_decoder("orjson") is piculet.json.loads
+
+
+def test_set_json_decoder_should_change_default_decoder(fake_json_decoder):
+    piculet.set_json_decoder("msgspec")
+    assert piculet.load_json(b'{"title": "Amelie"}') == {"title": "Fake"}
+    assert fake_json_decoder == [b'{"title": "Amelie"}']
+
+
+def test_scrape_should_use_spec_json_decoder(movie_spec, fake_json_decoder):
+    rule = {"key": "title", "extractor": {"path": "title"}}
+    spec = piculet.load_spec(
+        movie_spec
+        | {"path_type": "jmespath", "json_decoder": "msgspec", "rules": [rule]}
+    )
+    data = piculet.scrape(
+        b'{"title": "Amelie"}',
+        doctype="json",
+        rules=spec.rules,
+        json_decoder=spec.json_decoder,
+    )
+    assert data == {"title": "Fake"}
+    assert piculet.load_json(b'{"title": "Amelie"}') == {"title": "Amelie"}
+
+
+def test_json_decoder_should_fall_back_to_stdlib_on_rejected_document():
+    def strict(document):
+        raise ValueError("Integer exceeds 64-bit range")
+
+    decode = piculet._with_fallback(strict, (ValueError,))
+    assert decode(b'{"votes": 18446744073709551616}') == {
+        "votes": 2**64
+    }
+
+
+@pytest.mark.parametrize("name", sorted(piculet.json_decoders))
+def test_json_decoders_should_produce_same_decimals(movie_spec, name):
+    rule = {
+        "key": "rating",
+        "extractor": {"path": "rating", "transforms": ["decimal"]},
+    }
+    spec = piculet.load_spec(
+        movie_spec | {"path_type": "jmespath", "rules": [rule]}
+    )
+    data = piculet.scrape(
+        b'{"rating": 8.7}', doctype="json", rules=spec.rules, json_decoder=name
+    )
+    assert data == {"rating": Decimal("8.7")}
+
+
 def test_scrape_should_produce_concatenated_text(movie, movie_spec):
     rule = {"key": "full_title", "extractor": {"path": "//h1//text()"}}
     spec = piculet.load_spec(movie_spec | {"rules": [rule]})
@@ -261,3 +354,275 @@ def test_scrape_should_produce_subitem_lists_for_multivalued_subrules(
             {"character": "Wendy Torrance", "name": "Shelley Duvall"},
         ]
     }
+
+
+COMPILER_RULES = [
+    {"key": "title", "extractor": {"path": "//title/text()"}},
+    {"key": "foo", "extractor": {"path": "//foo/text()"}},
+    {
+        "key": "year",
+        "extractor": {
+            "path": '//span[@class="year"]/text()',
+            "transforms": ["int"],
+        },
+        "transforms": ["str"],
+    },
+    {
+        "key": "cast_names",
+        "extractor": {
+            "path": '//table[@class="cast"]/tr/td[1]/a/text()',
+            "sep": ", ",
+        },
+    },
+    {
+        "key": "genres",
+        "extractor": {
+            "foreach": '//ul[@class="genres"]/li',
+            "path": "./text()",
+            "transforms": ["lower"],
+        },
+    },
+    {
+        "key": "foos",
+        "extractor": {"foreach": '//ul[@class="foos"]/li', "path": "./text()"},
+    },
+    {
+        "foreach": '//div[@class="info"]',
+        "key": {"path": "./h3/text()", "transforms": ["lower"]},
+        "extractor": {"path": "./p/text()"},
+    },
+    {
+        "key": "director",
+        "extractor": {
+            "rules": [
+                {
+                    "key": "name",
+                    "extractor": {"path": '//div[@class="director"]//a/text()'},
+                },
+                {"key": "foo", "extractor": {"path": "//foo/text()"}},
+            ],
+        },
+    },
+    {
+        "key": "cast",
+        "extractor": {
+            "foreach": '//table[@class="cast"]/tr',
+            "rules": [
+                {"key": "name", "extractor": {"path": "./td[1]/a/text()"}},
+                {"key": "character", "extractor": {"path": "./td[2]/text()"}},
+            ],
+        },
+    },
+    {
+        "key": "nothing",
+        "extractor": {
+            "rules": [{"key": "foo", "extractor": {"path": "//foo/text()"}}],
+        },
+    },
+]
+
+
+@pytest.mark.parametrize("rule", COMPILER_RULES)
+def test_compiled_rules_should_produce_same_data_as_interpreter(
+    movie, movie_spec, rule
+):
+    spec = piculet.load_spec(movie_spec | {"rules": [rule]})
+    root = piculet.parse_html(movie)
+    assert spec.collector(root) == piculet.collect(root, spec.rules)
+
+
+def test_compiled_rules_should_produce_same_data_for_all_rules(
+    movie, movie_spec
+):
+    spec = piculet.load_spec(movie_spec | {"rules": COMPILER_RULES})
+    root = piculet.parse_html(movie)
+    data = spec.collector(root)
+    assert data == piculet.collect(root, spec.rules)
+    assert list(data) == list(piculet.collect(root, spec.rules))
+
+
+def test_compiled_rules_should_produce_same_data_for_map_rules(movie_spec):
+    rules = [
+        {"key": "title", "extractor": {"path": "title"}},
+        {"key": "missing", "extractor": {"path": "missing"}},
+        {
+            "key": "genres",
+            "extractor": {"foreach": "genres[*]", "path": "name"},
+        },
+        {
+            "foreach": "info",
+            "key": {"path": "label"},
+            "extractor": {"path": "value", "transforms": ["lower"]},
+        },
+        {
+            "key": "cast",
+            "extractor": {
+                "foreach": "cast",
+                "rules": [{"key": "name", "extractor": {"path": "name"}}],
+            },
+        },
+    ]
+    spec = piculet.load_spec(
+        movie_spec | {"path_type": "jmespath", "rules": rules}
+    )
+    root = {
+        "title": "The Shining",
+        "genres": [{"name": "Horror"}, {}, {"name": "Drama"}],
+        "info": [{"label": "runtime", "value": "144 Minutes"}],
+        "cast": [{"name": "Jack Nicholson"}, {"role": "?"}],
+    }
+    assert spec.collector(root) == piculet.collect(root, spec.rules)
+
+
+def test_compiled_rules_should_show_source_in_tracebacks(movie_spec):
+    rule = {"key": "k", "extractor": {"path": "k", "transforms": ["int"]}}
+    spec = piculet.load_spec(
+        movie_spec | {"path_type": "jmespath", "rules": [rule]}
+    )
+    with pytest.raises(ValueError) as e:
+        spec.collector({"k": "x"})
+    assert "value = _t" in "".join(traceback.format_exception(e.value))
+
+
+def test_spec_collector_should_be_compiled_once(movie_spec):
+    spec = piculet.load_spec(movie_spec | {"rules": COMPILER_RULES})
+    assert spec.collector is spec.collector
+
+
+def test_scrape_should_use_given_collector(movie, movie_spec):
+    spec = piculet.load_spec(movie_spec)
+    data = piculet.scrape(
+        movie,
+        doctype="html",
+        rules=spec.rules,
+        collector=lambda root: {"title": "Compiled"},
+    )
+    assert data == {"title": "Compiled"}
+
+
+PREFIX_DOCUMENT = {
+    "a": {
+        "b": {
+            "c": 1,
+            "d": [{"e": 1}, {"e": 2}, {"f": 3}],
+            "g": {"h": [[1, 2], [3]], "i": "x"},
+        },
+        "j": None,
+        "k": [1, 2],
+    },
+}
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "a.b.c",
+        "a.b",
+        "a.b.d[*].e",
+        "a.b.d[0].e",
+        "a.b.d[-1]",
+        "a.b.d[?e > `1`].e",
+        "a.b.g.h[]",
+        "a.b.g.*",
+        "a.b.d | length(@)",
+        "a.b.{c: c, i: g.i}",
+        "a.j.x",
+        "a.k.x",
+        "a.k[*]",
+        "a.b.d[*].e | [0]",
+    ],
+)
+@pytest.mark.parametrize("n", [1, 2])
+def test_stripped_path_should_give_same_result_from_prefix(path, n):
+    parsed = piculet.MapPath(path)._parsed
+    chain = piculet._leading_fields(parsed)
+    stripped = piculet._strip_fields(parsed, min(n, len(chain)))
+    prefix = piculet._lookup(PREFIX_DOCUMENT, chain[: min(n, len(chain))])
+    residual = piculet._compile_parsed(path, stripped)
+    assert residual(prefix) == piculet.MapPath(path).apply(PREFIX_DOCUMENT)
+
+
+@pytest.mark.parametrize(
+    ("path", "chain"),
+    [
+        ("a.b.c", ("a", "b", "c")),
+        ("a.b[*].c", ("a", "b")),
+        ("a[0].b", ("a",)),
+        ("a.b | c", ("a", "b")),
+        ("a.b || c", ()),
+        ("length(a.b)", ()),
+        ("@", ()),
+    ],
+)
+def test_leading_fields_should_stop_at_first_non_field(path, chain):
+    assert piculet._leading_fields(piculet.MapPath(path)._parsed) == chain
+
+
+def test_shared_prefixes_should_stop_where_paths_diverge():
+    chains = [("a", "b", "c"), ("a", "b", "d"), ("a", "e"), ("f",)]
+    assert piculet._shared_prefixes(chains) == [("a",), ("a", "b")]
+
+
+def test_compiled_rules_should_evaluate_shared_prefixes_once(movie_spec):
+    rules = [
+        {"key": "c", "extractor": {"path": "a.b.c"}},
+        {"key": "b", "extractor": {"path": "a.b"}},
+        {"key": "e", "extractor": {"foreach": "a.b.d", "path": "e"}},
+        {"key": "i", "extractor": {"path": "a.b.g.i", "transforms": ["str"]}},
+        {"key": "n", "extractor": {"path": "a.b.d | [1]"}},
+        {"key": "x", "extractor": {"path": "a.j.x"}},
+        {"key": "k", "extractor": {"path": "a.k[*]"}},
+        {
+            "foreach": "a.b.d",
+            "key": {"path": "e", "transforms": ["str"]},
+            "extractor": {"path": "e"},
+        },
+    ]
+    spec = piculet.load_spec(
+        movie_spec | {"path_type": "jmespath", "rules": rules}
+    )
+    assert "_lookup(root, ('a',))" in spec.collector.__source__
+    assert "_lookup(prefix0, ('b',))" in spec.collector.__source__
+    for root in [PREFIX_DOCUMENT, {}, {"a": None}, {"a": {"b": []}}]:
+        data = spec.collector(root)
+        assert data == piculet.collect(root, spec.rules)
+        assert list(data) == list(piculet.collect(root, spec.rules))
+
+
+SIMPLE_PATH_DOCUMENTS = [
+    PREFIX_DOCUMENT,
+    {"a": {"b": [{"c": 1}, None, {"c": None}, {"d": 2}, "c", [{"c": 3}]]}},
+    {"a": [{"b": [{"c": 1}, {"c": 2}]}, {"b": None}, {"b": [None, {}]}]},
+    {"a": {"b": "not a dict"}},
+    {"a": [1, None, 2]},
+    {"a": None},
+    {},
+    [],
+    None,
+]
+
+
+@pytest.mark.parametrize(
+    ("path", "simple"),
+    [
+        ("a", True),
+        ("a.b.c", True),
+        ("a[*]", True),
+        ("a.b[*].c", True),
+        ("a[*].b[*].c", True),
+        ("a[*].b.c", True),
+        ("a.b[*].c.d", True),
+        ("a.b[0]", False),
+        ("a.b[]", False),
+        ("a.*", False),
+        ("a.b[?c].c", False),
+        ("a.b | [0]", False),
+        ("a.b || a", False),
+        ("a.{x: b}", False),
+    ],
+)
+def test_map_path_should_give_same_result_as_jmespath(path, simple):
+    map_path = piculet.MapPath(path)
+    assert (piculet._compile_simple(map_path._parsed) is not None) == simple
+    for document in SIMPLE_PATH_DOCUMENTS:
+        assert map_path.apply(document) == jmespath.search(path, document)
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from cinemagoerng import web
+from cinemagoerng.proxies import ProxyPool
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        body = self.server.name.encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_proxies():
+    servers = []
+    for name in ["a", "b"]:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ProxyHandler)
+        server.name, server.status, server.paths = name, 200, []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def proxy_url(server):
+    return "http://%s:%d" % server.server_address
+
+
+def acquire_many(pool, n):
+    proxies = []
+    for _ in range(n):
+        proxy = pool.acquire()
+        pool.release(proxy)
+        proxies.append(proxy)
+    return proxies
+
+
+def test_proxy_pool_should_prefer_faster_proxy():
+    pool = ProxyPool(["a", "b"])
+    pool.record("a", 0.1, 200)
+    pool.record("b", 1.0, 200)
+    assert set(acquire_many(pool, 10)) == {"a"}
+
+
+def test_proxy_pool_should_spread_load_by_requests_in_flight():
+    pool = ProxyPool(["a", "b"])
+    pool.record("a", 0.1, 200)
+    pool.record("b", 0.25, 200)
+    assert [pool.acquire() for _ in range(3)] == ["a", "a", "b"]
+
+
+def test_proxy_pool_should_avoid_failing_proxy_without_latency():
+    pool = ProxyPool(["a", "b"], max_failures=3)
+    pool.record("a", 0.1, 503)
+    pool.record("b", 0.1, 200)
+    assert pool.stats["a"]["latency"] is None
+    assert set(acquire_many(pool, 10)) == {"b"}
+
+
+def test_proxy_pool_should_avoid_failing_proxy_when_none_succeeded():
+    pool = ProxyPool(["a", "b"], max_failures=3)
+    pool.record("a", 0.1, 503)
+    assert set(acquire_many(pool, 10)) == {"b"}
+
+
+def test_proxy_pool_should_eject_failing_proxy():
+    pool = ProxyPool(["a", "b"], max_failures=2)
+    pool.record("a", 0.1, 503)
+    pool.record("a", 0.1)
+    assert pool.stats["a"]["ejected"]
+    assert set(acquire_many(pool, 10)) == {"b"}
+
+
+def test_proxy_pool_should_reset_failures_after_success():
+    pool = ProxyPool(["a", "b"], max_failures=2)
+    pool.record("a", 0.1)
+    pool.record("a", 0.1, 200)
+    pool.record("a", 0.1)
+    assert not pool.stats["a"]["ejected"]
+
+
+def test_proxy_pool_should_use_ejected_proxy_if_all_are_ejected():
+    pool = ProxyPool(["a"], max_failures=1)
+    pool.record("a", 0.1)
+    assert pool.acquire() == "a"
+
+
+def test_proxy_pool_should_require_proxies():
+    with pytest.raises(ValueError):
+        ProxyPool([])
+
+
+def test_fetch_should_send_requests_through_proxies(fake_proxies):
+    pool = ProxyPool([proxy_url(server) for server in fake_proxies])
+    with web.HTTPClient(proxy_pool=pool) as client:
+        bodies = {client.fetch("http://www.imdb.com/title/tt0133093/") for _ in range(10)}
+        assert bodies == {b"a", b"b"}
+        assert len(client._clients) == 2
+    assert fake_proxies[0].paths[0] == "http://www.imdb.com/title/tt0133093/"
+    assert sum(stats["requests"] for stats in pool.stats.values()) == 10
+
+
+def test_fetch_should_eject_proxy_with_errors(fake_proxies):
+    fake_proxies[0].status = 502
+    pool = ProxyPool([proxy_url(server) for server in fake_proxies], max_failures=1)
+    with web.HTTPClient(proxy_pool=pool) as client:
+        for _ in range(5):
+            try:
+                client.fetch("http://www.imdb.com/")
+            except httpx.HTTPStatusError:
+                pass
+        assert client.fetch("http://www.imdb.com/") == b"b"
+    assert pool.stats[proxy_url(fake_proxies[0])]["ejections"] >= 1
+
+
+def test_fetch_async_should_send_requests_through_proxies(fake_proxies):
+    pool = ProxyPool([proxy_url(server) for server in fake_proxies])
+
+    async def run():
+        async with web.HTTPClient(proxy_pool=pool) as client:
+            return await asyncio.gather(*[client.fetch_async("http://www.imdb.com/") for _ in range(10)])
+
+    assert set(asyncio.run(run())) <= {b"a", b"b"}
+    assert all(stats["in_flight"] == 0 for stats in pool.stats.values())
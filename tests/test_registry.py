@@ -0,0 +1,39 @@
+import json
+
+import pytest
+from lxml.html import fromstring as parse_html
+
+from cinemagoerng import registry
+
+
+PAYLOAD = b'{"props": {"pageProps": {"title": "Am\xc3\xa9lie <3"}}}'
+
+
+@pytest.mark.parametrize(
+    "page",
+    [
+        b'<html><script id="__NEXT_DATA__" type="application/json">%s</script></html>',
+        b"<html><script type='application/json' id='__NEXT_DATA__'>%s</script></html>",
+        b'<html><SCRIPT id="__NEXT_DATA__">%s</script>',
+        b'<div>x</div><script id="__NEXT_DATA__">%s</script><script>tail()</script>',
+    ],
+)
+def test_find_next_data_should_return_script_contents(page):
+    document = page % PAYLOAD
+    assert registry.find_next_data(document) == PAYLOAD
+    root = parse_html(document.decode("utf-8"))
+    assert json.loads(registry.find_next_data(document)) == registry.parse_next_data(root)
+
+
+@pytest.mark.parametrize(
+    "page",
+    [
+        b"<html><script>%s</script></html>",
+        b'<html><script id="__NEXT_DATA__">%s</script><p>__NEXT_DATA__</p>',
+        b'<html><div id="__NEXT_DATA__">%s</div></html>',
+        b'<html><script data-id="__NEXT_DATA__x">%s</script></html>',
+        b'<html><script id="__NEXT_DATA__">%s',
+    ],
+)
+def test_find_next_data_should_give_up_on_unexpected_markup(page):
+    assert registry.find_next_data(page % PAYLOAD) is None
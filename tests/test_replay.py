@@ -0,0 +1,74 @@
+import asyncio
+import gzip
+import time
+
+import httpx
+import pytest
+
+from cinemagoerng import model, web
+from cinemagoerng.replay import RecordingTransport, ReplayMissError, ReplayTransport, request_key
+
+
+def test_request_key_should_ignore_param_and_json_key_order():
+    url1 = 'https://caching.graphql.imdb.com/?variables={"a":1,"b":"x"}&extensions={"v":1}'
+    url2 = 'https://caching.graphql.imdb.com/?extensions={"v":1}&variables={"b":"x","a":1}'
+    assert request_key(httpx.Request("GET", url1)) == request_key(httpx.Request("GET", url2))
+
+
+def test_request_key_should_distinguish_cursors():
+    url = 'https://caching.graphql.imdb.com/?variables={"after":"%s"}'
+    keys = {request_key(httpx.Request("GET", url % cursor)) for cursor in ["null", "2"]}
+    assert len(keys) == 2
+
+
+def test_replay_should_serve_recorded_bytes(tmp_path):
+    compressed = gzip.compress(b"hello")
+
+    def handler(request):
+        return httpx.Response(200, headers={"Content-Encoding": "gzip", "ETag": '"1"'}, content=compressed)
+
+    archive = tmp_path / "imdb.gz"
+    recorder = RecordingTransport(archive, transport=httpx.MockTransport(handler))
+    with httpx.Client(transport=recorder) as client:
+        assert client.get("https://www.imdb.com/").text == "hello"
+    assert recorder.responses[request_key(httpx.Request("GET", "https://www.imdb.com/"))].body == compressed
+
+    replay = ReplayTransport(archive)
+    with httpx.Client(transport=replay) as client:
+        response = client.get("https://www.imdb.com/")
+        assert (response.text, response.headers["ETag"]) == ("hello", '"1"')
+        with pytest.raises(ReplayMissError):
+            client.get("https://www.imdb.com/title/tt0133093/")
+    assert (replay.hits, replay.misses) == (1, 1)
+
+
+def test_replay_should_delay_responses(tmp_path):
+    archive = tmp_path / "imdb.gz"
+    recorder = RecordingTransport(archive, transport=httpx.MockTransport(lambda r: httpx.Response(200)))
+    with httpx.Client(transport=recorder) as client:
+        client.get("https://www.imdb.com/")
+
+    replay = ReplayTransport(archive, latency=lambda request: 0.05)
+    with httpx.Client(transport=replay) as client:
+        start = time.monotonic()
+        client.get("https://www.imdb.com/")
+        assert time.monotonic() - start >= 0.05
+
+
+def test_replay_should_serve_paginated_episodes(tmp_path, monkeypatch, episodes_handler):
+    archive = tmp_path / "imdb.gz"
+    requests = []
+    recorder = RecordingTransport(archive, transport=httpx.MockTransport(episodes_handler(requests)))
+    monkeypatch.setattr(web, "_http_client", web.HTTPClient(transport=recorder))
+    recorded = model.TVSeries(imdb_id="tt0000100", title="Series")
+    web.update_title(recorded, page="episodes_with_pagination", keys=["episodes"], paginate_result=True)
+    web._http_client.close()
+
+    replay = ReplayTransport(archive, latency=0.001)
+    monkeypatch.setattr(web, "_http_client", web.HTTPClient(transport=replay))
+    replayed = model.TVSeries(imdb_id="tt0000100", title="Series")
+    asyncio.run(
+        web.update_title_async(replayed, page="episodes_with_pagination", keys=["episodes"], paginate_result=True)
+    )
+    assert replayed.episodes == recorded.episodes
+    assert (replay.hits, replay.misses) == (len(requests), 0)
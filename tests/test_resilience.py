@@ -0,0 +1,177 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from cinemagoerng import web
+from cinemagoerng.resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy
+
+
+def test_retry_policy_should_retry_transient_statuses():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry(1, response=httpx.Response(503))
+    assert not policy.should_retry(1, response=httpx.Response(404))
+    assert not policy.should_retry(3, response=httpx.Response(503))
+
+
+def test_retry_policy_should_retry_transient_errors():
+    policy = RetryPolicy()
+    assert policy.should_retry(1, error=httpx.ReadTimeout("timeout"))
+    assert policy.should_retry(1, error=httpx.ConnectError("reset"))
+    assert not policy.should_retry(1, error=httpx.UnsupportedProtocol("ftp"))
+
+
+def test_retry_policy_delay_should_be_jittered_exponential():
+    policy = RetryPolicy(backoff=1.0, max_backoff=5.0)
+    for attempt, ceiling in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (10, 5.0)]:
+        delays = [policy.delay(attempt) for _ in range(50)]
+        assert all(0 <= d <= ceiling for d in delays)
+        assert len(set(delays)) > 1
+
+
+def test_retry_policy_should_honour_retry_after_seconds():
+    policy = RetryPolicy(max_backoff=10.0)
+    assert policy.delay(1, httpx.Response(429, headers={"Retry-After": "7"})) == 7
+    assert policy.delay(1, httpx.Response(429, headers={"Retry-After": "70"})) == 10
+
+
+def test_retry_policy_should_honour_retry_after_date():
+    policy = RetryPolicy()
+    when = datetime.now(timezone.utc) + timedelta(seconds=20)
+    response = httpx.Response(503, headers={"Retry-After": format_datetime(when, usegmt=True)})
+    assert 15 < policy.delay(1, response) <= 20
+
+
+def test_retry_budget_should_limit_retries():
+    policy = RetryPolicy(max_attempts=10, budget=RetryBudget(ratio=0.5, initial=1))
+    assert policy.should_retry(1, response=httpx.Response(503))
+    assert not policy.should_retry(2, response=httpx.Response(503))
+    policy.start()
+    policy.start()
+    assert policy.should_retry(2, response=httpx.Response(503))
+
+
+def flaky_handler(failures):
+    statuses = iter(failures)
+
+    def handler(request):
+        status = next(statuses, 200)
+        if status == "reset":
+            raise httpx.ReadError("connection reset")
+        return httpx.Response(status, text="ok", headers={"Retry-After": "0"})
+
+    return handler
+
+
+def test_fetch_should_retry_transient_failures():
+    policy = RetryPolicy(max_attempts=4, backoff=0.0)
+    transport = httpx.MockTransport(flaky_handler([503, "reset", 502]))
+    with web.HTTPClient(retry_policy=policy, transport=transport) as client:
+        assert client.fetch("https://www.imdb.com/") == b"ok"
+    assert policy.retries == 3
+
+
+def test_fetch_should_give_up_after_max_attempts():
+    policy = RetryPolicy(max_attempts=2, backoff=0.0)
+    transport = httpx.MockTransport(flaky_handler([503, 503, 503]))
+    client = web.HTTPClient(retry_policy=policy, transport=transport)
+    with client, pytest.raises(httpx.HTTPStatusError):
+        client.fetch("https://www.imdb.com/")
+
+
+def test_fetch_async_should_retry_transient_failures():
+    policy = RetryPolicy(max_attempts=3, backoff=0.0)
+    transport = httpx.MockTransport(flaky_handler(["reset", 429]))
+
+    async def run():
+        async with web.HTTPClient(retry_policy=policy, transport=transport) as client:
+            return await client.fetch_async("https://www.imdb.com/")
+
+    assert asyncio.run(run()) == b"ok"
+    assert policy.retries == 2
+
+
+def test_circuit_breaker_should_open_after_failure_rate():
+    breaker = CircuitBreaker(0.5, window=4, min_requests=4)
+    for status in [200, 503, 200]:
+        breaker.before_request("www.imdb.com")
+        breaker.record("www.imdb.com", status)
+    assert breaker.state("www.imdb.com") == "closed"
+    breaker.record("www.imdb.com")
+    assert breaker.state("www.imdb.com") == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request("www.imdb.com")
+    assert breaker.stats["www.imdb.com"]["rejected"] == 1
+
+
+def test_circuit_breaker_should_keep_hosts_apart():
+    breaker = CircuitBreaker(0.5, window=2, min_requests=2)
+    breaker.record("www.imdb.com", 503)
+    breaker.record("www.imdb.com", 503)
+    assert breaker.state("www.imdb.com") == "open"
+    breaker.before_request("caching.graphql.imdb.com")
+    assert breaker.state("caching.graphql.imdb.com") == "closed"
+
+
+def test_circuit_breaker_should_close_after_successful_probe():
+    breaker = CircuitBreaker(1.0, window=1, min_requests=1, reset_timeout=0.0)
+    breaker.record("www.imdb.com")
+    breaker.before_request("www.imdb.com")
+    assert breaker.state("www.imdb.com") == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request("www.imdb.com")
+    breaker.record("www.imdb.com", 200)
+    assert breaker.state("www.imdb.com") == "closed"
+
+
+def test_circuit_breaker_should_reopen_after_failed_probe():
+    breaker = CircuitBreaker(1.0, window=1, min_requests=1, reset_timeout=0.0)
+    breaker.record("www.imdb.com")
+    breaker.before_request("www.imdb.com")
+    breaker.record("www.imdb.com", 503)
+    assert breaker.state("www.imdb.com") == "open"
+    assert breaker.stats["www.imdb.com"]["trips"] == 2
+
+
+def test_fetch_should_fail_fast_when_circuit_is_open():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        raise httpx.ConnectTimeout("timeout")
+
+    breaker = CircuitBreaker(1.0, window=2, min_requests=2)
+    transport = httpx.MockTransport(handler)
+    with web.HTTPClient(circuit_breaker=breaker, transport=transport) as client:
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectTimeout):
+                client.fetch("https://www.imdb.com/")
+        with pytest.raises(CircuitOpenError):
+            client.fetch("https://www.imdb.com/")
+    assert len(requests) == 2
+
+
+def test_fetch_async_should_fail_fast_when_circuit_is_open():
+    breaker = CircuitBreaker(1.0, window=1, min_requests=1)
+    transport = httpx.MockTransport(lambda request: httpx.Response(503))
+
+    async def run():
+        async with web.HTTPClient(circuit_breaker=breaker, transport=transport) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.fetch_async("https://www.imdb.com/")
+            with pytest.raises(CircuitOpenError):
+                await client.fetch_async("https://www.imdb.com/")
+
+    asyncio.run(run())
+
+
+def test_retries_should_stop_when_circuit_opens():
+    policy = RetryPolicy(max_attempts=5, backoff=0.0)
+    breaker = CircuitBreaker(1.0, window=2, min_requests=2)
+    transport = httpx.MockTransport(flaky_handler([503] * 5))
+    client = web.HTTPClient(retry_policy=policy, circuit_breaker=breaker, transport=transport)
+    with client, pytest.raises(CircuitOpenError):
+        client.fetch("https://www.imdb.com/")
+    assert policy.retries == 2
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from cinemagoerng import web
+
+
+def test_search_titles_should_collect_all_pages(fake_search):
+    titles = web.search_titles("matrix", count=3, total_count=None, paginate=True)
+    assert [t.imdb_id for t in titles] == [f"tt{i:07d}" for i in range(1, 11)]
+    assert len(fake_search) == 4
+
+
+def test_search_titles_should_stop_at_total_count(fake_search):
+    titles = web.search_titles("matrix", count=3, total_count=5, paginate=True)
+    assert len(titles) == 6
+    assert len(fake_search) == 2
+
+
+def test_search_titles_async_should_collect_all_pages(fake_search):
+    titles = asyncio.run(web.search_titles_async("matrix", count=4, total_count=None, paginate=True))
+    assert len(titles) == 10
+    assert len(fake_search) == 3
+
+
+def test_iter_search_titles_should_fetch_pages_lazily(fake_search):
+    titles = web.iter_search_titles("matrix", count=3)
+    first = [next(titles) for _ in range(3)]
+    assert [t.imdb_id for t in first] == ["tt0000001", "tt0000002", "tt0000003"]
+    assert len(fake_search) == 1
+    next(titles)
+    assert len(fake_search) == 2
+    assert len(list(titles)) == 6
+
+
+def test_iter_search_titles_should_not_paginate_if_not_requested(fake_search):
+    titles = list(web.iter_search_titles("matrix", count=3, paginate=False))
+    assert len(titles) == 3
+
+
+def test_iter_search_titles_async_should_yield_all_titles(fake_search):
+    async def run():
+        return [t.imdb_id async for t in web.iter_search_titles_async("matrix", count=3)]
+
+    assert asyncio.run(run()) == [f"tt{i:07d}" for i in range(1, 11)]
+    assert len(fake_search) == 4
+
+
+def test_pipelined_search_titles_should_collect_all_pages(fake_search):
+    titles = web.search_titles("matrix", count=3, total_count=None, paginate=True, pipeline=True)
+    assert [t.imdb_id for t in titles] == [f"tt{i:07d}" for i in range(1, 11)]
+    assert len(fake_search) == 4
+
+
+def test_pipelined_search_titles_should_stop_at_total_count(fake_search):
+    titles = web.search_titles("matrix", count=3, total_count=5, paginate=True, pipeline=True)
+    assert len(titles) == 6
+    assert len(fake_search) == 2
+
+
+def test_pipelined_iter_search_titles_should_prefetch_next_page(fake_search):
+    titles = web.iter_search_titles("matrix", count=3, pipeline=True)
+    next(titles)
+    # the first graphql page is requested in the background
+    deadline = time.monotonic() + 1.0
+    while (len(fake_search) < 2) and (time.monotonic() < deadline):
+        time.sleep(0.001)
+    assert len(fake_search) == 2
+    assert len(list(titles)) == 9
+
+
+def test_pipelined_search_titles_async_should_collect_all_pages(fake_search):
+    titles = asyncio.run(
+        web.search_titles_async("matrix", count=4, total_count=None, paginate=True, pipeline=True)
+    )
+    assert [t.imdb_id for t in titles] == [f"tt{i:07d}" for i in range(1, 11)]
+    assert len(fake_search) == 3
+
+
+def test_pipelined_iter_search_titles_async_should_stop_at_total_count(fake_search):
+    async def run():
+        titles = web.iter_search_titles_async("matrix", count=3, total_count=5, pipeline=True)
+        return [t async for t in titles]
+
+    assert len(asyncio.run(run())) == 6
+    assert len(fake_search) == 2
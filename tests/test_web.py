@@ -1,3 +1,6 @@
+import asyncio
+
+import httpx
 import pytest
 
 from cinemagoerng import web
@@ -14,3 +17,172 @@ def test_updating_title_should_update_only_given_keys(imdb_id, n):
     assert len(parsed.taglines) == 1
     web.update_title(parsed, page="taglines", keys=["taglines"])
     assert len(parsed.taglines) == n
+
+
+@pytest.fixture
+def title_cache(monkeypatch):
+    cache = web.TitleCache(ttl=60.0)
+    monkeypatch.setattr(web, "_title_cache", cache)
+    return cache
+
+
+def test_get_title_should_use_title_cache(fake_imdb, title_cache):
+    first = web.get_title("tt0133093", page="taglines")
+    second = web.get_title("tt0133093", page="taglines")
+    assert second == first
+    assert len(fake_imdb) == 1
+    assert title_cache.stats["hits"] == 1
+
+
+def test_title_cache_should_return_copies(fake_imdb, title_cache):
+    first = web.get_title("tt0133093", page="taglines")
+    first.taglines.append("Changed")
+    second = web.get_title("tt0133093", page="taglines")
+    assert second.taglines == ["Tagline"]
+
+
+def test_title_cache_should_distinguish_pages(fake_imdb, title_cache):
+    web.get_title("tt0133093", page="taglines")
+    web.get_title("tt0133093", page="taglines", season=1)
+    assert len(fake_imdb) == 2
+
+
+def test_get_title_async_should_use_title_cache(fake_imdb, title_cache):
+    async def run():
+        await web.get_title_async("tt0133093", page="taglines")
+        return await web.get_title_async("tt0133093", page="taglines")
+
+    assert asyncio.run(run()).title == "Title tt0133093"
+    assert len(fake_imdb) == 1
+
+
+def test_title_cache_should_evict_by_size(fake_imdb):
+    title = web.get_title("tt0133093", page="taglines")
+    cache = web.TitleCache(max_bytes=cache_size(title) * 2 + 1)
+    for i in range(3):
+        cache.set(i, title)
+    assert cache.get(0) is None
+    assert cache.get(2) == title
+
+
+def test_title_cache_should_expire_titles(fake_imdb):
+    title = web.get_title("tt0133093", page="taglines")
+    cache = web.TitleCache(ttl=0.0)
+    cache.set("k", title)
+    assert cache.get("k") is None
+
+
+def cache_size(title):
+    cache = web.TitleCache()
+    cache.set("k", title)
+    return cache.size
+
+
+def test_concurrent_get_title_async_should_share_fetch(fake_imdb):
+    async def run():
+        calls = [web.get_title_async("tt0133093", page="taglines") for _ in range(10)]
+        return await asyncio.gather(*calls)
+
+    saved = web.title_flight.saved
+    titles = asyncio.run(run())
+    assert len(fake_imdb) == 1
+    assert web.title_flight.saved - saved == 9
+    assert all(t == titles[0] for t in titles)
+    assert len({id(t) for t in titles}) == 10
+
+
+def test_joined_get_title_async_should_not_see_changes_of_first_caller(
+    fake_imdb,
+):
+    async def first():
+        title = await web.get_title_async("tt0133093", page="taglines")
+        title.taglines.append("MUTATED")
+        return title
+
+    async def run():
+        return await asyncio.gather(
+            first(), web.get_title_async("tt0133093", page="taglines")
+        )
+
+    saved = web.title_flight.saved
+    changed, joined = asyncio.run(run())
+    assert web.title_flight.saved - saved == 1
+    assert changed.taglines[-1] == "MUTATED"
+    assert "MUTATED" not in joined.taglines
+
+
+def test_get_titles_async_should_yield_all_results(fake_imdb):
+    async def run():
+        ids = ["tt0133093", "tt0000000", "tt0109151"]
+        return [r async for r in web.get_titles_async(ids, page="taglines", max_concurrency=2)]
+
+    results = dict(asyncio.run(run()))
+    assert results["tt0133093"].title == "Title tt0133093"
+    assert results["tt0109151"].title == "Title tt0109151"
+    assert results["tt0000000"] is None
+
+
+def test_get_titles_async_should_yield_exceptions(monkeypatch):
+    def handler(request):
+        return httpx.Response(500)
+
+    client = web.HTTPClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(web, "_http_client", client)
+
+    async def run():
+        return [r async for r in web.get_titles_async(["tt0133093"], page="taglines")]
+
+    [(_, error)] = asyncio.run(run())
+    assert isinstance(error, httpx.HTTPStatusError)
+
+
+def test_get_titles_async_should_limit_concurrency(monkeypatch, taglines_page):
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        imdb_id = request.url.path.split("/")[2]
+        return httpx.Response(200, text=taglines_page(imdb_id, imdb_id, []))
+
+    client = web.HTTPClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(web, "_http_client", client)
+
+    def ids():
+        for i in range(20):
+            yield f"tt{i:07d}1"
+
+    async def run():
+        return [r async for r in web.get_titles_async(ids(), page="taglines", max_concurrency=3)]
+
+    results = asyncio.run(run())
+    assert len(results) == 20
+    assert peak == 3
+
+
+def test_scraping_should_give_same_data_with_and_without_parsing(taglines_page):
+    spec = web._spec("title_taglines")
+    operation = web.GetTitle(None)
+    page = taglines_page("tt0133093", "The Matrix", ["Free your mind."]).encode()
+    ambiguous = page + b"<p>__NEXT_DATA__</p>"
+    assert web.registry.find_next_data(ambiguous) is None
+    assert operation._scrape(page, spec) == operation._scrape(ambiguous, spec)
+    assert operation._scrape(page, spec)["taglines"] == ["Free your mind."]
+
+
+@pytest.mark.parametrize("page", sorted(p.stem for p in web.SPECS_DIR.glob("*.json")))
+def test_compiling_specs_should_produce_collectors(page):
+    assert callable(web._spec(page).collector)
+
+
+def test_compiled_spec_should_produce_same_data_as_interpreter(taglines_page):
+    spec = web._spec("title_taglines")
+    page = taglines_page("tt0133093", "The Matrix", ["Free your mind.", "Believe."])
+    next_data = web.registry.find_next_data(page.encode())
+    root = web.piculet.load_json(next_data)
+    assert spec.collector(root) == web.piculet.collect(root, spec.rules)
+    assert spec.collector(root)["taglines"] == ["Free your mind.", "Believe."]